@@ -0,0 +1,270 @@
+"""
+Registry of interchangeable implementations ('backends') of the timestep
+of equation (13), each advancing the field configurations many timesteps:
+
+rolling :  'next_timestep', the Rolling Array equation (16)
+inplace :  'Stepper', slice arithmetic in preallocated buffers,
+           one 'Stepper' kept per lattice, shape and dtype, whose
+           buffers are returned and overwritten by the next call
+sparse :   the Matrix Method equation (14) with a scipy.sparse CSR matrix,
+           if SciPy is installed
+numba :    'fused_steps', if Numba is installed
+numexpr :  the Rolling Array evaluated by numexpr, if it is installed
+
+Defines functions:
+
+register
+available_backends
+matrix_operator
+benchmark_backends
+auto_backend
+backend_name
+get_backend
+advance
+next_frame
+
+The backend is chosen by name, else by the environment variable
+STEPPING_BACKEND, else 'rolling'. The name 'auto' times every installed
+backend once per lattice size, dtype and number of replicas and caches
+the fastest in the JSON file STEPPING_BACKEND_CACHE
+(by default ~/.stepping_backends.json).
+"""
+import functools
+import json
+import os
+import tempfile
+import time
+
+from Discretisation import np, default_lattice, next_timestep, \
+                            fused_steps, Stepper, numba
+
+try:
+    import scipy.sparse
+except ImportError:
+    scipy = None
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+
+backends = {}       # name: function(f_old, f, steps, lattice)
+
+
+def register(name, available=True):
+    """
+    Decorator adding a function(f_old, f, steps, lattice), returning the
+    field configurations 'steps' timesteps later, to the registry as 'name',
+    if 'available'
+    """
+    def decorator(function):
+        if available:
+            backends[name] = function
+        return function
+    return decorator
+
+
+def available_backends():
+    """
+    Names of the installed backends
+    """
+    return list( backends )
+
+
+@register('rolling')
+def _rolling(f_old, f, steps, lattice):
+    for _ in range( steps ):
+        f_old, f = next_timestep(f_old, f, lattice)
+    return f_old, f
+
+
+_steppers = {}      # (lattice, shape, dtype): 'Stepper' of 'inplace'
+
+
+@register('inplace')
+def _inplace(f_old, f, steps, lattice):
+    # the returned fields are buffers of the 'Stepper',
+    # overwritten by the next call of the same lattice, shape and dtype
+    key = (lattice, np.shape(f), np.result_type(f))
+    stepper = _steppers.get(key)
+    if stepper is None:
+        stepper = _steppers[key] = Stepper(f_old, f, lattice)
+    else:
+        stepper.load(f_old, f)
+    for _ in range( steps ):
+        stepper.next_timestep()
+    return stepper.f_old, stepper.f
+
+
+@functools.lru_cache(maxsize=16)
+def matrix_operator(lattice=default_lattice):
+    """
+    The periodic tridiagonal matrix 'M' of the Matrix Method equation (14)
+    as a scipy.sparse CSR matrix, 3 N entries rather than N**2
+    """
+    N = lattice.N
+    C = np.dtype(lattice.dtype).type
+    diagonals = [ C(lattice.C_2), C(lattice.C_1), C(lattice.C_2) ]
+    M = scipy.sparse.diags( diagonals, [-1, 0, 1], shape=(N, N),
+                           format='lil', dtype=lattice.dtype )
+    M[0, N-1] = M[N-1, 0] = lattice.C_2
+    return M.tocsr()
+
+
+@register('sparse', available=scipy is not None)
+def _sparse(f_old, f, steps, lattice):
+    M = matrix_operator(lattice)
+    C_3 = lattice.C_3
+    for _ in range( steps ):
+        # M acts on each replica, the rows of an (R, N) ensemble
+        f_old, f = f, - f_old + (M @ f.T).T + C_3 * f * f * f
+    return f_old, f
+
+
+@register('numba', available=numba is not None)
+def _numba(f_old, f, steps, lattice):
+    return fused_steps(f_old, f, steps, lattice)
+
+
+@register('numexpr', available=numexpr is not None)
+def _numexpr(f_old, f, steps, lattice):
+    C_1, C_2, C_3 = lattice.C_1, lattice.C_2, lattice.C_3
+    for _ in range( steps ):
+        left, right = np.roll(f, 1, axis=-1), np.roll(f, -1, axis=-1)
+        f_old, f = f, numexpr.evaluate(
+                        '-f_old + C_1 * f + C_2 * (left + right) + '
+                        'C_3 * f * f * f' )
+    return f_old, f
+
+
+def benchmark_backends(lattice=default_lattice, replicas=None, steps=100,
+                       repeats=3):
+    """
+    Times every installed backend on a field near the vacuum
+    of the 'lattice', with 'replicas' replicas if given
+
+    Returns
+    -------
+    seconds : dictionary of the best time per timestep of each backend
+    """
+    shape = (lattice.N,) if replicas is None else (replicas, lattice.N)
+    rng = np.random.default_rng(0)
+    f = ( -1 + 0.1 * rng.standard_normal(shape) ).astype(lattice.dtype)
+    f_old = f.copy()
+
+    seconds = {}
+    for name, backend in backends.items():
+        backend(f_old, f, 1, lattice)           # warm up, e.g. compile
+        best = np.inf
+        for _ in range( repeats ):
+            t0 = time.perf_counter()
+            backend(f_old, f, steps, lattice)
+            best = min( best, (time.perf_counter() - t0) / steps )
+        seconds[name] = best
+    return seconds
+
+
+def _cache_path():
+    return os.environ.get( 'STEPPING_BACKEND_CACHE',
+                           os.path.join(os.path.expanduser('~'),
+                                        '.stepping_backends.json') )
+
+
+@functools.lru_cache(maxsize=None)
+def auto_backend(lattice=default_lattice, replicas=None):
+    """
+    Name of the fastest installed backend for the 'lattice' and 'replicas',
+    read from the cache file if there, otherwise found using
+    'benchmark_backends' and added to the cache file
+    """
+    key = '/'.join([ str(lattice.N), np.dtype(lattice.dtype).name,
+                     str(replicas), ','.join(sorted(backends)) ])
+    path = _cache_path()
+    try:
+        with open(path) as file:
+            cache = json.load(file)
+    except (FileNotFoundError, ValueError):
+        cache = {}
+
+    if cache.get(key) not in backends:
+        seconds = benchmark_backends(lattice, replicas)
+        cache[key] = min( seconds, key=seconds.get )
+
+        # write through a temporary file of this process, other processes
+        # may be reading or writing; failing to write only costs a re-time
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+            try:
+                with os.fdopen(fd, 'w') as file:
+                    json.dump(cache, file, indent=2)
+                os.replace(tmp, path)
+            except BaseException:
+                os.remove(tmp)
+                raise
+        except OSError:
+            pass
+
+    return cache[key]
+
+
+def backend_name(name=None, lattice=default_lattice, replicas=None):
+    """
+    Name of the backend called 'name', by default that of the environment
+    variable STEPPING_BACKEND or 'rolling';
+    'auto' selects one using 'auto_backend'
+    """
+    if name is None:
+        name = os.environ.get('STEPPING_BACKEND', 'rolling')
+    if name == 'auto':
+        name = auto_backend(lattice, replicas)
+    if name not in backends:
+        raise ValueError('unknown or unavailable backend ' + repr(name)
+                         + ', available: ' + ', '.join(backends))
+    return name
+
+
+def get_backend(name=None, lattice=default_lattice, replicas=None):
+    """
+    The backend chosen by 'backend_name'
+
+    Returns
+    -------
+    backend : function(f_old, f, steps, lattice)
+    """
+    return backends[ backend_name(name, lattice, replicas) ]
+
+
+def advance(f_old, f, steps, lattice=default_lattice, backend=None):
+    """
+    Given the previous and current field configurations, 'f_old' and 'f',
+    updates the field configurations by 'steps' timesteps
+    according to equation (13)
+    using the backend chosen by 'get_backend'
+
+    The 'inplace' backend returns the buffers of its 'Stepper', which the
+    next call of the same lattice, shape and dtype overwrites; copy them
+    to keep a frame
+
+    Returns
+    -------
+    f :     current field configuration
+    f_new : next field configuration
+    """
+    replicas = None if np.ndim(f) == 1 else len(f)
+    return get_backend(backend, lattice, replicas)(f_old, f, steps, lattice)
+
+
+def next_frame(f_old, f, lattice=default_lattice, backend=None):
+    """
+    Given the previous and current field configurations, 'f_old' and 'f',
+    updates the field configurations to the next frame
+    using 'advance', whose 'inplace' backend returns buffers
+    overwritten by its next call, so copy them to keep a frame
+
+    Returns
+    -------
+    f :     current field configuration
+    f_new : next field configuration
+    """
+    return advance(f_old, f, lattice.frame_space, lattice, backend)
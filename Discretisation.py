@@ -4,52 +4,128 @@ and Energy Equation (6):
 
 next_timestep
 next_frame
+fused_steps
+next_frame_fused
 energy
+next_timestep_energy
+
+Defines the classes:
+
+Lattice
+Stepper
+LangevinStepper
 
 Defines the variables:
     
-L, N, lamb, dx, dt, frame_space
+L, N, lamb, dx, dt, frame_space, default_lattice
+
+Every function takes the lattice parameters as a 'Lattice',
+by default 'default_lattice' built from the variables above,
+so many lattice sizes can be run side by side in one process.
+
+Every function accepts either a single field configuration of shape (N,)
+or an ensemble of R replicas of shape (R, N), periodic along the last axis;
+one call then advances or measures every replica at once.
+
+'fused_steps' is compiled with Numba when it is installed,
+otherwise it falls back to repeated calls of 'next_timestep'.
 """
+from dataclasses import dataclass, field
+
 import numpy as np
 import matplotlib.pyplot as plt
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+@dataclass(frozen=True)
+class Lattice:
+    """
+    Immutable lattice parameters,
+    with the units and coefficients derived from them precomputed
+    
+    Parameters
+    ----------
+    L :           length of domain
+    N :           number of nodes
+    lamb :        potential coefficient λ
+    frame_space : time between measurements (timesteps)
+    dtype :       floating point type of the field arrays, 
+                  np.float32 halves the memory traffic of the stencil
+    """
+    L: float = 100
+    N: int = 512
+    lamb: float = 0.5
+    frame_space: int = 10
+    dtype: type = np.float64
+    
+    dx: float = field(init=False, repr=False)
+    dt: float = field(init=False, repr=False)
+    C_1: float = field(init=False, repr=False)
+    C_2: float = field(init=False, repr=False)
+    C_3: float = field(init=False, repr=False)
+    quad: float = field(init=False, repr=False)
+
+    def __post_init__(self):
+        # units 
+        dx = self.L / self.N            # spatial distance between nodes
+        dt = dx / 4                     # time-step between states
+        
+        # coefficients
+        C_2 = dt**2 / dx**2
+        C_3 = -self.lamb * dt**2
+        C_1 = 2 - 2 * C_2 - C_3
+        
+        # Quadratic coefficient (lambda * p / 2) 
+        # of the Node Energy Polynomial (29)
+        quad = 1 / (2 * dt * dt) + 1 / (4 * dx * dx) - 0.5*self.lamb
+        
+        for name, value in [('dx', dx), ('dt', dt), ('C_1', C_1), 
+                            ('C_2', C_2), ('C_3', C_3), ('quad', quad)]:
+            object.__setattr__(self, name, value)
+
 
 # system variables
 L = 100                     # length of domain
 N = 512                     # number of nodes
 lamb = 0.5                  # potential coefficient λ
-
-# units 
-dx = L / N                  # spatial distance between nodes
-dt = dx / 4                 # time-step between states
 frame_space = 10            # time between measurements (timesteps)
 
+default_lattice = Lattice(L, N, lamb, frame_space)
+
+# units 
+dx = default_lattice.dx     # spatial distance between nodes
+dt = default_lattice.dt     # time-step between states
 
 # coefficients
-C_2 = dt**2 / dx**2
-C_3 = -lamb * dt**2
-C_1 = 2 - 2 * C_2 - C_3
+C_1 = default_lattice.C_1
+C_2 = default_lattice.C_2
+C_3 = default_lattice.C_3
 
 
-def next_timestep(f_old, f):
+def next_timestep(f_old, f, lattice=default_lattice):
     """
     Given the previous and current field configurations, 'f_old' and 'f',
     updates the field configurations to the next timestep
     according to equation (13)
     
     In particular uses the Rolling Array equation (16)
+    along the last axis, so an (R, N) ensemble is stepped at once
     
     Returns
     -------
     f :     current field configuration
     f_new : next field configuration 
     """
-    return f, (-f_old + C_1 * f +
-            C_2 * (np.roll(f, 1) + np.roll(f, -1)) +
-            C_3 * f ** 3)
+    return f, (-f_old + lattice.C_1 * f +
+            lattice.C_2 * (np.roll(f, 1, axis=-1) + np.roll(f, -1, axis=-1)) +
+            lattice.C_3 * f ** 3)
 
 
-def next_frame(f_old, f):
+def next_frame(f_old, f, lattice=default_lattice):
     """
     Given the previous and current field configurations, 'f_old' and 'f',
     updates the field configurations to the next frame
@@ -61,19 +137,102 @@ def next_frame(f_old, f):
     f_new : next field configuration 
     """
     # until next frame
-    for _ in range( frame_space ):
+    for _ in range( lattice.frame_space ):
         # update the system by one timestep
-        f_old, f = next_timestep(f_old, f)
+        f_old, f = next_timestep(f_old, f, lattice)
         
     return f_old, f
 
 
-def energy(f_old, f):
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _fused_steps(f_old, f, steps, C_1, C_2, C_3):
+        """
+        Compiled kernel of 'fused_steps' for an (R, N) ensemble;
+        each replica is advanced 'steps' timesteps in a single loop,
+        one pass over memory per timestep, replicas in parallel
+        """
+        R, n = f.shape
+        f_old_out = np.empty_like(f)
+        f_out = np.empty_like(f)
+        
+        for r in numba.prange(R):
+            a = f_old[r].copy()
+            b = f[r].copy()
+            c = np.empty_like(b)
+            
+            for _ in range(steps):
+                # boundary nodes wrap around periodically
+                c[0] = (-a[0] + C_1 * b[0] + C_2 * (b[n-1] + b[1]) +
+                        C_3 * b[0] * b[0] * b[0])
+                for i in range(1, n-1):
+                    c[i] = (-a[i] + C_1 * b[i] + C_2 * (b[i-1] + b[i+1]) +
+                            C_3 * b[i] * b[i] * b[i])
+                c[n-1] = (-a[n-1] + C_1 * b[n-1] + C_2 * (b[n-2] + b[0]) +
+                          C_3 * b[n-1] * b[n-1] * b[n-1])
+                
+                # rotate the buffers
+                a, b, c = b, c, a
+                
+            f_old_out[r] = a
+            f_out[r] = b
+            
+        return f_old_out, f_out
+
+
+def fused_steps(f_old, f, steps, lattice=default_lattice):
+    """
+    Given the previous and current field configurations, 'f_old' and 'f',
+    updates the field configurations by 'steps' timesteps
+    according to equation (13)
+    
+    With Numba installed, all 'steps' leapfrog updates run in one compiled
+    loop; otherwise falls back to repeated calls of 'next_timestep'
+    
+    Returns
+    -------
+    f :     current field configuration
+    f_new : next field configuration 
+    """
+    if numba is None:
+        for _ in range( steps ):
+            f_old, f = next_timestep(f_old, f, lattice)
+        return f_old, f
+    
+    # the compiled kernel works on an (R, N) ensemble
+    # with coefficients of the same type as the field
+    shape = np.shape(f)
+    C = f.dtype.type
+    f_old, f = _fused_steps(np.atleast_2d(f_old), np.atleast_2d(f), steps,
+                            C(lattice.C_1), C(lattice.C_2), C(lattice.C_3))
+    return f_old.reshape(shape), f.reshape(shape)
+
+
+def next_frame_fused(f_old, f, lattice=default_lattice):
+    """
+    Given the previous and current field configurations, 'f_old' and 'f',
+    updates the field configurations to the next frame
+    using 'fused_steps'
+    
+    Returns
+    -------
+    f :     current field configuration
+    f_new : next field configuration 
+    """
+    return fused_steps(f_old, f, lattice.frame_space, lattice)
+
+
+def energy(f_old, f, lattice=default_lattice, dtype=None):
     """
     Given the previous and current field configurations, 'f_old' and 'f',
     calculates the Kinetic, Interaction, Potential and Total Energy 
     according to equations (17), (18), (19), (20)
     
+    For an (R, N) ensemble each term is an array of R per-replica values
+    
+    The sums accumulate in 'dtype' if given, 
+    e.g. np.float64 for np.float32 fields
+    
     Returns
     -------
     K :  kinetic term
@@ -81,8 +240,196 @@ def energy(f_old, f):
     P :  potential term
     E :  total energy
     """
-    K = np.sum( ( f - f_old )**2 ) / (2 * dt * dt)
-    I = np.sum( f * ( f - np.roll( f, 2 ) ) ) / (4 * dx * dx)
-    P = lamb * np.sum( ( f * f - 1 )**2 ) / 4
+    dt, dx = lattice.dt, lattice.dx
+    K = np.sum( ( f - f_old )**2, axis=-1, dtype=dtype ) / (2 * dt * dt)
+    I = np.sum( f * ( f - np.roll( f, 2, axis=-1 ) ), axis=-1, 
+               dtype=dtype ) / (4 * dx * dx)
+    P = lattice.lamb * np.sum( ( f * f - 1 )**2, axis=-1, dtype=dtype ) / 4
     E = K + I + P
-    return K, I, P, E
\ No newline at end of file
+    return K, I, P, E
+
+
+def next_timestep_energy(f_old, f, lattice=default_lattice, dtype=None):
+    """
+    Given the previous and current field configurations, 'f_old' and 'f',
+    updates the field configurations to the next timestep
+    according to equation (13), as 'next_timestep',
+    and calculates the energies of 'f_old' and 'f', as 'energy',
+    reusing the terms of the update
+    
+    The neighbour sum s = f[k-1] + f[k+1] of the update gives 
+    the Interaction Term (18) through
+        sum( f[k] * f[k-2] ) = sum( s * s ) / 2 - sum( f * f ),
+    and f * f serves both the cube and the Potential Term (19)
+    
+    Returns
+    -------
+    f :        current field configuration
+    f_new :    next field configuration 
+    energies : K, I, P, E of 'f_old' and 'f', as returned by 'energy'
+    """
+    dt, dx = lattice.dt, lattice.dx
+    s = np.roll(f, 1, axis=-1) + np.roll(f, -1, axis=-1)
+    f2 = f * f
+    f_new = -f_old + lattice.C_1 * f + lattice.C_2 * s + lattice.C_3 * f2 * f
+    
+    K = np.sum( ( f - f_old )**2, axis=-1, dtype=dtype ) / (2 * dt * dt)
+    I = ( 2 * np.sum( f2, axis=-1, dtype=dtype ) 
+         - np.sum( s * s, axis=-1, dtype=dtype ) / 2 ) / (4 * dx * dx)
+    P = lattice.lamb * np.sum( ( f2 - 1 )**2, axis=-1, dtype=dtype ) / 4
+    return f, f_new, (K, I, P, K + I + P)
+
+
+class Stepper:
+    """
+    Allocation-free stepping engine for equation (13)
+    
+    Owns three preallocated buffers holding the previous, current and next
+    field configurations and rotates them between timesteps instead of
+    returning new arrays. The Rolling Array equation (16) is evaluated with
+    'out=' ufuncs and slice arithmetic in place of 'np.roll'; the results
+    match 'next_timestep' to rounding error.
+    
+    Accepts a single field configuration or an (R, N) ensemble.
+    """
+    def __init__(self, f_old, f, lattice=default_lattice):
+        self.lattice = lattice
+        self._buffers = [np.array(f_old), np.array(f), np.empty_like(f)]
+
+    def load(self, f_old, f):
+        """
+        Replaces the field configurations with copies of 'f_old' and 'f',
+        of the shape and dtype of the buffers, without allocating;
+        the buffers themselves, as returned by the stepping methods,
+        are taken as they are
+        """
+        f_old_buffer, f_buffer, scratch = self._buffers
+        if f_old is f_old_buffer and f is f_buffer:
+            return
+        
+        # 'f' first into the spare buffer, which is never handed out,
+        # so either field may be one of the other buffers
+        np.copyto(scratch, f)
+        np.copyto(f_old_buffer, f_old)
+        self._buffers = [f_old_buffer, scratch, f_buffer]
+
+    @property
+    def f_old(self):
+        """previous field configuration (a view of an internal buffer)"""
+        return self._buffers[0]
+
+    @property
+    def f(self):
+        """current field configuration (a view of an internal buffer)"""
+        return self._buffers[1]
+
+    def next_timestep(self):
+        """
+        Updates the field configurations to the next timestep
+        according to equation (13), in place
+        
+        Returns
+        -------
+        f :     current field configuration
+        f_new : next field configuration 
+        """
+        f_old, f, f_new = self._buffers
+        C_1, C_2, C_3 = self.lattice.C_1, self.lattice.C_2, self.lattice.C_3
+        
+        # -f_old + C_1 * f
+        np.negative(f_old, out=f_new)
+        np.multiply(f, C_1, out=f_old)
+        f_new += f_old
+        
+        # f_old is no longer needed, so serves as scratch space
+        # C_2 * (left + right neighbours), periodic in the last axis
+        np.add(f[..., :-2], f[..., 2:], out=f_old[..., 1:-1])
+        np.add(f[..., -1], f[..., 1], out=f_old[..., 0])
+        np.add(f[..., -2], f[..., 0], out=f_old[..., -1])
+        f_old *= C_2
+        f_new += f_old
+        
+        # C_3 * f ** 3, as products since 'np.power' is slow for f < 0
+        np.multiply(f, f, out=f_old)
+        f_old *= f
+        f_old *= C_3
+        f_new += f_old
+        
+        # rotate the buffers
+        self._buffers = [f, f_new, f_old]
+        return f, f_new
+
+    def next_frame(self):
+        """
+        Updates the field configurations to the next frame, in place
+        using 'next_timestep'
+        
+        Returns
+        -------
+        f :     current field configuration
+        f_new : next field configuration 
+        """
+        # until next frame
+        for _ in range( self.lattice.frame_space ):
+            # update the system by one timestep
+            self.next_timestep()
+            
+        return self.f_old, self.f
+
+
+class LangevinStepper(Stepper):
+    """
+    Stepping engine for equation (13) in contact with a heat bath of
+    temperature 'T' through friction 'gamma', the Langevin equation
+    
+    f_tt = ( equation (5) ) - gamma f_t + sqrt(2 gamma T) xi(t)
+    
+    discretised as by Gronbech-Jensen and Farago, 
+    with a = gamma dt / 2 and Gaussian noise beta of variance 2 gamma T dt:
+    
+    f_new = ( ( equation (13) ) + a f_old + dt (beta + beta_next) / 2 )
+            / (1 + a)
+    
+    which reduces to equation (13) for gamma = 0 and samples the 
+    configurations of temperature 'T' correctly for any timestep.
+    The attributes 'gamma' and 'T' may be changed between timesteps,
+    e.g. to quench, and may be per-replica arrays for an (R, N) ensemble.
+    Draws from the global NumPy random state, as 'heat_bath'.
+    """
+    def __init__(self, f_old, f, gamma, T, lattice=default_lattice):
+        super().__init__(f_old, f, lattice)
+        self.gamma = gamma
+        self.T = T
+        self._extra = np.empty_like(self._buffers[1])
+        self._beta = self._noise()
+
+    def _noise(self):
+        # Gaussian noise of variance 2 gamma T dt, per replica
+        variance = 2 * np.multiply(self.gamma, self.T) * self.lattice.dt
+        scale = np.expand_dims( np.sqrt(variance), -1 )
+        return scale * np.random.normal(size=self._buffers[1].shape)
+
+    def next_timestep(self):
+        """
+        Updates the field configurations to the next timestep
+        according to the discretised Langevin equation, in place
+        
+        Returns
+        -------
+        f :     current field configuration
+        f_new : next field configuration 
+        """
+        dt = self.lattice.dt
+        a = np.expand_dims( np.multiply(self.gamma, dt / 2), -1 )
+        
+        # a * f_old + dt * (beta + beta_next) / 2
+        beta_next = self._noise()
+        np.multiply(self._buffers[0], a, out=self._extra)
+        self._extra += dt / 2 * (self._beta + beta_next)
+        self._beta = beta_next
+        
+        # equation (13), then the friction and noise
+        f, f_new = super().next_timestep()
+        f_new += self._extra
+        f_new /= 1 + a
+        return f, f_new
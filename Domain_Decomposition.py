@@ -0,0 +1,323 @@
+"""
+Defines a domain decomposition of the periodic lattice for very large N,
+splitting the ring of nodes into one segment per thread:
+
+segment_bounds
+heat_bath_iteration_decomposed
+heat_bath_decomposed
+pairs_decomposed
+
+Defines the classes:
+
+Domain
+DecomposedStepper
+
+Segments only read beyond their ends through halo cells:
++-1 node for the timestep of equation (13),
++-2 nodes for the heat bath coupling of 'linear_coefficient',
+w_kink - 1 nodes for the runs of 'pairs'.
+All work within a segment is done by NumPy ufuncs, which release the GIL,
+so the segments run in parallel on a thread pool.
+
+Works on single field configurations of shape (N,).
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+from Discretisation import np, default_lattice
+from Initial_Conditions import prob_accept
+from Kinks_and_Creations import h_kink, w_kink, long_run_ends, \
+                                pairs_from_events
+
+
+def segment_bounds(N, segments):
+    """
+    Splits the N nodes into 'segments' contiguous segments of near equal
+    size, each starting at a multiple of 4, so that every segment holds
+    nodes of all four heat bath sublattices
+
+    Returns
+    -------
+    bounds : list of the (start, stop) nodes of each segment
+    """
+    if N < 4 * segments:
+        raise ValueError('need at least 4 nodes per segment')
+    edges = 4 * ( np.arange(segments + 1) * (N // 4) // segments )
+    edges[-1] = N
+    return [ (int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) ]
+
+
+class Domain:
+    """
+    Splits the lattice into one segment per thread, 'threads' by default
+    the number of cores, and runs work on the segments in a thread pool
+
+    Use as a context manager, or call 'close' when done.
+    """
+    def __init__(self, threads=None, lattice=default_lattice):
+        self.threads = threads or os.cpu_count()
+        self.lattice = lattice
+        self.bounds = segment_bounds(lattice.N, self.threads)
+        self.barrier = threading.Barrier(self.threads)
+        self._executor = ThreadPoolExecutor(self.threads)
+
+    def map(self, function, *args):
+        """
+        Calls function(start, stop, *args) for every segment in parallel
+
+        Returns
+        -------
+        results : list of the return values, in order of the segments
+        """
+        futures = [ self._executor.submit(function, a, b, *args)
+                    for a, b in self.bounds ]
+        return [ future.result() for future in futures ]
+
+    def close(self):
+        """
+        Shuts down the thread pool
+        """
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DecomposedStepper:
+    """
+    Stepping engine for equation (13) on a 'Domain'
+
+    As 'Stepper', owns three rotating buffers, here each padded with one
+    halo node at either end holding the periodic neighbour, so every
+    segment reads its neighbours as plain slices. Each thread updates its
+    own segment, then the segments at the ends of the ring refresh the
+    halo nodes; a barrier separates the timesteps.
+    """
+    def __init__(self, f_old, f, domain):
+        self.domain = domain
+        N = domain.lattice.N
+        self._buffers = [ np.empty(N + 2, dtype=domain.lattice.dtype)
+                          for _ in range(3) ]
+        for buffer, field in zip(self._buffers, (f_old, f)):
+            self._fill(buffer, field)
+        self._steps = 0
+
+    @staticmethod
+    def _fill(buffer, field):
+        # the nodes, then the halo nodes from the other end of the ring
+        buffer[1:-1] = field
+        buffer[0], buffer[-1] = field[-1], field[0]
+
+    def load(self, f_old, f):
+        """
+        Replaces the field configurations with copies of 'f_old' and 'f',
+        as 'Stepper.load', refreshing the halo nodes, without allocating;
+        either may be a field configuration of this stepper, e.g. one
+        changed in place by a heat bath iteration
+        """
+        f_old_buffer, f_buffer, spare = [ self._buffers[(self._steps + i) % 3]
+                                          for i in range(3) ]
+
+        # 'f' first into the spare buffer, which is never handed out
+        self._fill(spare, f)
+        self._fill(f_old_buffer, f_old)
+        self._buffers = [f_old_buffer, spare, f_buffer]
+        self._steps = 0
+
+    @property
+    def f_old(self):
+        """
+        Previous field configuration
+        """
+        return self._buffers[self._steps % 3][1:-1]
+
+    @property
+    def f(self):
+        """
+        Current field configuration
+        """
+        return self._buffers[(self._steps + 1) % 3][1:-1]
+
+    def _segment_steps(self, a, b, steps):
+        """
+        Updates the nodes 'a' to 'b' by 'steps' timesteps,
+        waiting for every segment after each
+        """
+        C_1, C_2, C_3 = (self.domain.lattice.C_1, self.domain.lattice.C_2,
+                         self.domain.lattice.C_3)
+        N = self.domain.lattice.N
+        barrier = self.domain.barrier
+        scratch = np.empty(b - a, dtype=self._buffers[0].dtype)
+
+        # nodes of the segment and their neighbours, in padded indices
+        node, left, right = slice(a+1, b+1), slice(a, b), slice(a+2, b+2)
+
+        try:
+            for step in range(self._steps, self._steps + steps):
+                f_old, f, f_new = [ self._buffers[(step + i) % 3]
+                                    for i in range(3) ]
+
+                # -f_old + C_1 * f
+                np.negative(f_old[node], out=f_new[node])
+                np.multiply(f[node], C_1, out=scratch)
+                f_new[node] += scratch
+
+                # C_2 * (left + right neighbours)
+                np.add(f[left], f[right], out=scratch)
+                scratch *= C_2
+                f_new[node] += scratch
+
+                # C_3 * f ** 3
+                np.multiply(f[node], f[node], out=scratch)
+                scratch *= f[node]
+                scratch *= C_3
+                f_new[node] += scratch
+
+                # halo nodes of the next field configuration
+                if a == 0:
+                    f_new[N+1] = f_new[1]
+                if b == N:
+                    f_new[0] = f_new[N]
+
+                barrier.wait()
+        except BaseException:
+            # release the other segments rather than leave them waiting
+            barrier.abort()
+            raise
+
+    def steps(self, steps):
+        """
+        Updates the field configurations by 'steps' timesteps
+        according to equation (13), in place
+
+        Returns
+        -------
+        f :     current field configuration
+        f_new : next field configuration
+        """
+        self.domain.barrier.reset()
+        self.domain.map(self._segment_steps, steps)
+        self._steps += steps
+        return self.f_old, self.f
+
+    def next_timestep(self):
+        """
+        Updates the field configurations to the next timestep
+        """
+        return self.steps(1)
+
+    def next_frame(self):
+        """
+        Updates the field configurations to the next frame
+        """
+        return self.steps(self.domain.lattice.frame_space)
+
+
+def heat_bath_iteration_decomposed(f_old, f, T, sigma, domain, rngs):
+    """
+    Updates the field configuration 'f'
+    according to one iteration of the Metropolis Hastings Algorithm
+    using 'prob_accept'
+
+    As 'heat_bath_iteration_vectorized', the sublattices (k mod 4) are
+    visited in random order, drawn from the first generator of 'rngs';
+    within a sublattice each segment proposes and accepts its own nodes,
+    drawing from its own generator of the rest of 'rngs'.
+    The +-2 halo nodes are read from the neighbouring segments,
+    which belong to other sublattices and so are not being updated.
+    """
+    lattice = domain.lattice
+    if lattice.N % 4 != 0:
+        raise ValueError('sublattice updates require N divisible by 4')
+    segment_rngs = { a: rng for (a, b), rng in zip(domain.bounds, rngs[1:]) }
+
+    def update(a, b, s):
+        rng = segment_rngs[a]
+        k = np.arange(a + (s - a) % 4, b, 4)
+        y = f[k]
+
+        # Propose new values according to G(z|y)
+        z = rng.normal(y, sigma)
+
+        # Accept changes according to A(z|y)
+        r = rng.random(len(k))
+        with np.errstate(over='ignore'):
+            accept = r < prob_accept(f_old, f, T, k, z, y, lattice)
+        f[k] = np.where(accept, z, y)
+
+    # For each sublattice, randomly ordered
+    for s in rngs[0].permutation(4):
+        domain.map(update, s)
+
+    return f
+
+
+def heat_bath_decomposed(T, domain, iter_max=100, sigma_factor=0.05,
+                         seed=None):
+    """
+    Prepares a thermalised state of temperature 'T' on a 'Domain'
+    as 'heat_bath', using 'heat_bath_iteration_decomposed'
+    and 'DecomposedStepper'
+
+    Each segment draws from its own child of np.random.SeedSequence('seed'),
+    so the state is reproducible for a given seed and number of threads
+
+    Returns
+    -------
+    f_old : previous field configuration
+    f :     current field configuration
+    """
+    rngs = [ np.random.default_rng(s) for s in
+             np.random.SeedSequence(seed).spawn(domain.threads + 1) ]
+    sigma = sigma_factor * np.sqrt(T)
+
+    # prepare the ground state
+    f_old = -np.ones(domain.lattice.N, dtype=domain.lattice.dtype)
+    f = -np.ones(domain.lattice.N, dtype=domain.lattice.dtype)
+    stepper = DecomposedStepper(f_old, f, domain)
+
+    # For a number of iterations
+    # Evolve in contact with a Heat Bath
+    for iter_num in range(iter_max):
+        f = heat_bath_iteration_decomposed(stepper.f_old, stepper.f, T,
+                                           sigma, domain, rngs)
+
+        # evolve by a timestep, from the changed field configuration
+        stepper.load(stepper.f_old, f)
+        stepper.next_timestep()
+
+    return stepper.f_old.copy(), stepper.f.copy()
+
+
+def pairs_decomposed(f, domain):
+    """
+    Calculates the pair number 'n' of 'f', as 'pairs'
+
+    Each segment finds its zero-crossings and the ends of its kink and
+    anti-kink runs, reading w_kink - 1 halo nodes before its start so
+    that runs crossing into it from the previous segment are complete.
+    The events of all segments, in order, are merged by
+    'pairs_from_events', so blocks may span any number of segments.
+    """
+    N = domain.lattice.N
+
+    def events(a, b):
+        # the segment with w_kink - 1 halo nodes before it, wrapping around
+        halo = np.take(f, np.arange(a - w_kink + 1, b), mode='wrap')
+        zeros = a + np.flatnonzero( halo[w_kink - 1 :] *
+                                    halo[w_kink - 2 : -1] < 0 )
+
+        def ends(mask):
+            # runs ending in the segment lie wholly in the segment and halo
+            return a + np.flatnonzero(
+                            long_run_ends(mask, w_kink)[w_kink - 1 :] )
+
+        return zeros, ends(halo > h_kink), ends(halo < -h_kink)
+
+    zeros, kink_ends, anti_kink_ends = [ np.concatenate(e) for e in
+                                         zip(*domain.map(events)) ]
+    return int( pairs_from_events(zeros, kink_ends, anti_kink_ends, 1, N)[0] )
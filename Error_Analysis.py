@@ -0,0 +1,154 @@
+"""
+Defines tools to estimate the statistical error of the mean of a
+correlated time series, such as the pair number of successive frames:
+
+OnlineBlocking
+autocorrelation_time
+
+'OnlineBlocking' streams the series, using constant memory, so a run can
+stop as soon as the error is small enough;
+'autocorrelation_time' analyses a stored series.
+"""
+from Discretisation import np
+
+
+class OnlineBlocking:
+    """
+    Blocking analysis of a time series fed one value at a time
+
+    Level 0 holds the values themselves, level l the averages of
+    successive blocks of 2**l values; only the sums and the one unpaired
+    value of each level are kept. Once blocks are longer than the
+    autocorrelation time their averages are independent, so the naive
+    error of the mean at that level is the true one.
+
+    The error is taken as the largest estimate over levels with at least
+    'min_blocks' blocks, which includes the plateau once the series is
+    long enough.
+    """
+    def __init__(self, min_blocks=32):
+        self.min_blocks = min_blocks
+        self.count = 0
+        self._sums = []
+        self._squares = []
+        self._counts = []
+        self._pending = []
+
+    def feed(self, x):
+        """
+        Adds the next value 'x' of the series
+        """
+        self.count += 1
+        level = 0
+        while True:
+            if level == len(self._sums):
+                self._sums.append(0.0)
+                self._squares.append(0.0)
+                self._counts.append(0)
+                self._pending.append(None)
+
+            self._sums[level] += x
+            self._squares[level] += x * x
+            self._counts[level] += 1
+
+            # pair with the unpaired value to form a block of the next level
+            if self._pending[level] is None:
+                self._pending[level] = x
+                return
+            x = (self._pending[level] + x) / 2
+            self._pending[level] = None
+            level += 1
+
+    def mean(self):
+        """
+        Mean of the series so far
+        """
+        if self.count == 0:
+            return np.nan
+        return self._sums[0] / self._counts[0]
+
+    def level_errors(self):
+        """
+        Naive error of the mean at each level with at least
+        'min_blocks' blocks
+
+        Returns
+        -------
+        errors : array of the error estimate of each level
+        """
+        errors = []
+        for s, q, n in zip(self._sums, self._squares, self._counts):
+            if n < max(self.min_blocks, 2):
+                break
+            variance = max( q / n - (s / n)**2, 0 )
+            errors.append( np.sqrt( variance / (n - 1) ) )
+        return np.array(errors)
+
+    def error(self):
+        """
+        Error of the mean, infinite while there are too few values
+        """
+        errors = self.level_errors()
+        if len(errors) == 0:
+            return np.inf
+        return np.max(errors)
+
+    def tau_int(self):
+        """
+        Integrated autocorrelation time (values), from the ratio of the
+        error to the naive error of the values themselves
+        """
+        errors = self.level_errors()
+        if len(errors) == 0 or errors[0] == 0:
+            return np.nan
+        return 0.5 * ( np.max(errors) / errors[0] )**2
+
+    def effective_samples(self):
+        """
+        Number of independent values the series is worth
+        """
+        tau = self.tau_int()
+        if np.isnan(tau):
+            return 0.0
+        return self.count / (2 * tau)
+
+    def relative_error(self):
+        """
+        Error of the mean relative to the mean,
+        infinite while the mean is 0
+        """
+        mean = self.mean()
+        if not mean:
+            return np.inf
+        return self.error() / abs(mean)
+
+
+def autocorrelation_time(series, c=5):
+    """
+    Integrated autocorrelation time (values) of a stored 'series'
+    from its autocorrelation function, found with 'np.fft',
+    summed up to the first lag M with M >= 'c' * tau (Sokal's window)
+
+    Returns
+    -------
+    tau_int : integrated autocorrelation time
+    error :   error of the mean of 'series'
+    """
+    x = np.asarray(series, dtype=float)
+    n = len(x)
+    x = x - np.mean(x)
+
+    # autocorrelation function, padded against wrap-around
+    transform = np.fft.rfft(x, n=2*n)
+    acf = np.fft.irfft(transform * np.conj(transform))[:n] / n
+    if acf[0] == 0:
+        return np.nan, 0.0
+    rho = acf / acf[0]
+
+    # running estimate, cut at the first self-consistent window
+    tau = np.cumsum(rho) - 0.5
+    window = np.flatnonzero( np.arange(n) >= c * tau )
+    M = window[0] if len(window) else n - 1
+    tau_int = tau[M]
+
+    return tau_int, np.sqrt( 2 * tau_int * acf[0] / n )
@@ -3,54 +3,113 @@ Defines functions to implement the Metropolis Hastings Algorithm:
 
 linear_coefficient
 energy_diff
+energy_diff_terms
 prob_accept
 heat_bath_iteration
+heat_bath_iteration_vectorized
 heat_bath
+drift_statistic
+heat_bath_equilibrated
+heat_bath_adaptive
+heat_bath_langevin
+parallel_tempering
+
+and functions to sample approximately thermalised states directly:
+
+initial_fourier
+harmonic_frequencies
+thermal_state
 """
-from Discretisation import np, N, lamb, dx, dt, next_timestep
+from Discretisation import np, default_lattice, next_timestep, energy, \
+                            next_timestep_energy, LangevinStepper
+from Error_Analysis import autocorrelation_time
 
 
 # Quadratic coefficient (lambda * p / 2) of the Node Energy Polynomial (29)
-quad = 1 / (2 * dt * dt) + 1 / (4 * dx * dx) - 0.5*lamb
+quad = default_lattice.quad
 
 
-def linear_coefficient(f_old, f, k):
+def linear_coefficient(f_old, f, k, lattice=default_lattice):
     """
     Linear coefficient (lambda * q) of the Node Energy Polynomial (29)
+    
+    'k' may be a single node or an array of nodes,
+    'f_old' and 'f' a single field or an (R, N) ensemble
     """
-    return - f_old[k] / (dt * dt) - (f[k-2] + f[(k+2)%N]) / (4 * dx * dx)
+    dt, dx = lattice.dt, lattice.dx
+    return - f_old[..., k] / (dt * dt) - \
+            (f[..., k-2] + f[..., (k+2)%lattice.N]) / (4 * dx * dx)
 
 
-def energy_diff(f_old, f, k, z, y):
+def energy_diff(f_old, f, k, z, y, lattice=default_lattice):
     """
     Calculates the Energy Difference according to Equation (30)
     using 'linear_coefficient'
     
     Behaves better factorised.
     """
-    lin = linear_coefficient(f_old, f, k)
-    D_E = (z-y) * (  (z+y) * ( lamb * (z*z+y*y) / 4 + quad )  + lin ) 
+    lin = linear_coefficient(f_old, f, k, lattice)
+    D_E = (z-y) * (  (z+y) * ( lattice.lamb * (z*z+y*y) / 4 + lattice.quad )
+                   + lin ) 
     return  D_E
 
 
-def prob_accept(f_old, f, T, k, z, y):
+def energy_diff_terms(f_old, f, k, z, y, lattice=default_lattice):
+    """
+    Splits the Energy Difference of 'energy_diff' into the changes of the
+    Kinetic, Interaction and Potential Terms (17), (18), (19)
+    when node 'k' changes from 'y' to 'z'
+    
+    Returns
+    -------
+    D_K : change of the kinetic term
+    D_I : change of the interaction term
+    D_P : change of the potential term
+    """
+    dt, dx = lattice.dt, lattice.dx
+    g_old = f_old[..., k]
+    neighbours = f[..., k-2] + f[..., (k+2)%lattice.N]
+    D_K = (z-y) * (z + y - 2 * g_old) / (2 * dt * dt)
+    D_I = (z-y) * (z + y - neighbours) / (4 * dx * dx)
+    D_P = lattice.lamb * (z-y) * (z+y) * (z*z + y*y - 2) / 4
+    return D_K, D_I, D_P
+
+
+def prob_accept(f_old, f, T, k, z, y, lattice=default_lattice,
+                return_terms=False):
     """
     Calculates the Acceptance Probability A(z|y) according to Equation (39)
     using 'energy_diff'
+    
+    If 'return_terms', the Energy Difference is found from its terms
+    using 'energy_diff_terms', which are also returned, 
+    so energies can be updated without calculating them again
     """
-    Diff_E = energy_diff(f_old, f, k, z, y)
+    if return_terms:
+        D_K, D_I, D_P = energy_diff_terms(f_old, f, k, z, y, lattice)
+        return np.exp(- (D_K + D_I + D_P) / T), (D_K, D_I, D_P)
+    Diff_E = energy_diff(f_old, f, k, z, y, lattice)
     return np.exp(- Diff_E / T)
 
 
-def heat_bath_iteration(f_old, f, T, sigma):
+def heat_bath_iteration(f_old, f, T, sigma, lattice=default_lattice,
+                        energies=None, return_accepted=False):
     """
     Updates the field configuration 'f' 
     according to one iteration of the Metropolis Hastings Algorithm
     using 'prob_accept'
+    
+    If given, 'energies', an array of K, I, P, E as returned by 'energy',
+    is updated in place with the accepted changes,
+    the terms of 'energy_diff_terms' returned by 'prob_accept'
+    
+    If 'return_accepted', also returns the number of accepted changes
     """    
+    accepted = 0
+    
     # Attach a Heat Bath
     # For each node, randomly ordered
-    for k in np.random.permutation(N):
+    for k in np.random.permutation(lattice.N):
         y = f[k]
         
         # Propose a new value according to G(z|y)
@@ -58,31 +117,468 @@ def heat_bath_iteration(f_old, f, T, sigma):
             
         # Accept change according to A(z|y)
         r = np.random.rand()
-        if r < prob_accept(f_old, f, T, k, z, y):
+        if energies is None:
+            p = prob_accept(f_old, f, T, k, z, y, lattice)
+        else:
+            p, (D_K, D_I, D_P) = prob_accept(f_old, f, T, k, z, y, lattice,
+                                             return_terms=True)
+        if r < p:
+            if energies is not None:
+                energies += (D_K, D_I, D_P, D_K + D_I + D_P)
             f[k] = z
+            accepted += 1
     
+    if return_accepted:
+        return f, accepted
     return f
 
 
-def heat_bath(T, iter_max=100, sigma_factor=0.05):
+def heat_bath_iteration_vectorized(f_old, f, T, sigma, 
+                                   lattice=default_lattice, energies=None,
+                                   return_accepted=False):
+    """
+    Updates the field configuration 'f' 
+    according to one iteration of the Metropolis Hastings Algorithm
+    using 'prob_accept'
+    
+    Node k only couples to nodes k-2 and k+2 through 'linear_coefficient',
+    so the nodes of each sublattice (k mod 4) are independent; 
+    each sublattice, randomly ordered, is proposed and accepted 
+    as a whole-array operation with batch-drawn random numbers.
+    
+    'f_old' and 'f' may be an (R, N) ensemble, 
+    with 'T' and 'sigma' either scalars or per-replica arrays of length R
+    
+    If given, 'energies', an array of K, I, P, E as returned by 'energy',
+    is updated in place with the accepted changes,
+    the terms of 'energy_diff_terms' returned by 'prob_accept'
+    
+    If 'return_accepted', also returns the number of accepted changes,
+    per replica for an ensemble
+    """
+    if lattice.N % 4 != 0:
+        raise ValueError('sublattice updates require N divisible by 4')
+    
+    # per-replica values broadcast along the nodes
+    T = np.expand_dims(T, -1)
+    sigma = np.expand_dims(sigma, -1)
+    
+    accepted = np.zeros(f.shape[:-1], dtype=int)
+    
+    # For each sublattice, randomly ordered
+    for s in np.random.permutation(4):
+        k = np.arange(s, lattice.N, 4)
+        y = f[..., k]
+        
+        # Propose new values according to G(z|y)
+        z = np.random.normal(y, sigma)
+        
+        # Accept changes according to A(z|y)
+        r = np.random.rand(*y.shape)
+        with np.errstate(over='ignore'):
+            if energies is None:
+                accept = r < prob_accept(f_old, f, T, k, z, y, lattice)
+            else:
+                p, terms = prob_accept(f_old, f, T, k, z, y, lattice,
+                                       return_terms=True)
+                accept = r < p
+        if energies is not None:
+            D_K, D_I, D_P = [ np.sum( np.where(accept, D, 0), axis=-1 ) 
+                              for D in terms ]
+            energies += (D_K, D_I, D_P, D_K + D_I + D_P)
+        f[..., k] = np.where(accept, z, y)
+        accepted += np.sum(accept, axis=-1)
+    
+    if return_accepted:
+        return f, accepted
+    return f
+
+
+def heat_bath(T, iter_max=100, sigma_factor=0.05, vectorized=False,
+              lattice=default_lattice):
     """
     Prepares a thermalised state of tmperature 'T'
     by applying 'iter_max' iterations of the Metropolis Hastings Algorithm
-    using 'heat_bath_iteration'
+    using 'heat_bath_iteration', 
+    or 'heat_bath_iteration_vectorized' if 'vectorized'
+    
+    If 'T' is an array of R temperatures, 
+    prepares an (R, N) ensemble with one replica per temperature,
+    always using 'heat_bath_iteration_vectorized'
     """
     # standard deviation
     sigma = sigma_factor * np.sqrt(T)
     
     # prepare the ground state
-    f_old = -np.ones(N)
-    f = -np.ones(N)
+    shape = np.shape(T) + (lattice.N,)
+    f_old = -np.ones(shape, dtype=lattice.dtype)
+    f = -np.ones(shape, dtype=lattice.dtype)
+    
+    if np.ndim(T) > 0:
+        vectorized = True
+    iteration = heat_bath_iteration_vectorized if vectorized \
+                else heat_bath_iteration
 
     # For a number of iterations
     # Evolve in contact with a Heat Bath
     for iter_num in range(iter_max):
-        f = heat_bath_iteration(f_old, f, T, sigma)
+        f = iteration(f_old, f, T, sigma, lattice)
         
         # evolve by a timestep
-        f_old, f = next_timestep(f_old, f)
+        f_old, f = next_timestep(f_old, f, lattice)
 
-    return f_old, f
\ No newline at end of file
+    return f_old, f
+
+
+def drift_statistic(alpha, window):
+    """
+    Windowed stationarity test of the series 'alpha' (values along axis 0),
+    e.g. the energy per node per unit temperature E / (N T) of each
+    heat bath iteration: the change in the mean between the last two
+    windows of 'window' values, relative to the mean of the last window
+    
+    Returns
+    -------
+    drift : relative drift, an array for an (iterations, R) series,
+            infinite while there are fewer than 2 'window' values
+    """
+    alpha = np.asarray(alpha, dtype=float)
+    if len(alpha) < 2 * window:
+        return np.full(alpha.shape[1:], np.inf)
+    previous = np.mean( alpha[-2*window : -window], axis=0 )
+    last = np.mean( alpha[-window:], axis=0 )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.abs( last - previous ) / np.abs( last )
+
+
+def heat_bath_equilibrated(T, window=20, tolerance=0.02, iter_max=2000,
+                           sigma_factor=0.05, vectorized=False,
+                           lattice=default_lattice):
+    """
+    Prepares a thermalised state of temperature 'T' as 'heat_bath',
+    but rather than a fixed number of iterations, stops once the energy
+    per node per unit temperature, alpha = E / (N T), passes the 
+    stationarity test of 'drift_statistic' with a relative drift below
+    'tolerance', or after 'iter_max' iterations
+    
+    The energy of each iteration is measured by 'next_timestep_energy'
+    while taking the timestep. For an array of temperatures every replica
+    is iterated until all have passed.
+    
+    Returns
+    -------
+    f_old :       previous field configuration
+    f :           current field configuration
+    diagnostics : dictionary of 
+                  'iterations', the number of iterations used,
+                  'drift', the final drift statistic of each replica,
+                  'equilibrated', whether each replica passed the test 
+                  rather than hitting 'iter_max',
+                  'alpha', the alpha of each iteration
+    """
+    # standard deviation
+    sigma = sigma_factor * np.sqrt(T)
+    
+    # prepare the ground state
+    shape = np.shape(T) + (lattice.N,)
+    f_old = -np.ones(shape, dtype=lattice.dtype)
+    f = -np.ones(shape, dtype=lattice.dtype)
+    
+    if np.ndim(T) > 0:
+        vectorized = True
+    iteration = heat_bath_iteration_vectorized if vectorized \
+                else heat_bath_iteration
+    
+    alpha = []
+    drift = np.full(np.shape(T), np.inf)
+    
+    # Evolve in contact with a Heat Bath until stationary
+    for iter_num in range(iter_max):
+        f = iteration(f_old, f, T, sigma, lattice)
+        
+        # evolve by a timestep, measuring the energy
+        f_old, f, (K, I, P, E) = next_timestep_energy(f_old, f, lattice)
+        alpha.append( E / (lattice.N * np.asarray(T)) )
+        
+        drift = drift_statistic(alpha, window)
+        if np.all( drift < tolerance ):
+            break
+    
+    diagnostics = { 'iterations': len(alpha),
+                    'drift': drift,
+                    'equilibrated': drift < tolerance,
+                    'alpha': np.array(alpha) }
+    return f_old, f, diagnostics
+
+
+def heat_bath_adaptive(T, iter_max=100, burn_in=50, target=0.5, 
+                       sigma_factor=0.05, vectorized=False,
+                       lattice=default_lattice):
+    """
+    Prepares a thermalised state of temperature 'T' as 'heat_bath',
+    but first tunes the proposal width during 'burn_in' iterations:
+    after each, sigma is scaled by exp(acceptance - 'target'), starting
+    from 'sigma_factor' * sqrt(T). Sigma is then frozen, so that detailed
+    balance holds, for the 'iter_max' production iterations.
+    
+    The energy of each production iteration is measured by 
+    'next_timestep_energy' and its integrated autocorrelation time 
+    (iterations) found with 'autocorrelation_time'.
+    For an array of temperatures sigma is tuned per replica.
+    
+    Returns
+    -------
+    f_old :       previous field configuration
+    f :           current field configuration
+    diagnostics : dictionary of 
+                  'sigma', the frozen proposal width of each replica,
+                  'acceptance', the acceptance rate of every iteration,
+                  burn-in then production,
+                  'tau_int', the integrated autocorrelation time of the 
+                  production energy of each replica
+    """
+    # standard deviation
+    sigma = sigma_factor * np.sqrt(T)
+    
+    # prepare the ground state
+    shape = np.shape(T) + (lattice.N,)
+    f_old = -np.ones(shape, dtype=lattice.dtype)
+    f = -np.ones(shape, dtype=lattice.dtype)
+    
+    if np.ndim(T) > 0:
+        vectorized = True
+    iteration = heat_bath_iteration_vectorized if vectorized \
+                else heat_bath_iteration
+    
+    acceptance = []
+    E_array = []
+    
+    # For a number of iterations
+    # Evolve in contact with a Heat Bath
+    for iter_num in range(burn_in + iter_max):
+        f, accepted = iteration(f_old, f, T, sigma, lattice,
+                                return_accepted=True)
+        acceptance.append( accepted / lattice.N )
+        
+        # tune during burn-in only
+        if iter_num < burn_in:
+            sigma = sigma * np.exp( acceptance[-1] - target )
+        
+        # evolve by a timestep, measuring the energy
+        f_old, f, (K, I, P, E) = next_timestep_energy(f_old, f, lattice)
+        if iter_num >= burn_in:
+            E_array.append( E )
+    
+    # autocorrelation time of each replica
+    E_array = np.reshape( E_array, (iter_max, -1) )
+    tau_int = np.array([ autocorrelation_time(E)[0] for E in E_array.T ])
+    
+    diagnostics = { 'sigma': sigma,
+                    'acceptance': np.array(acceptance),
+                    'tau_int': tau_int.reshape(np.shape(T)) }
+    return f_old, f, diagnostics
+
+
+def heat_bath_langevin(T, tmax_dt=1000, gamma=1.0, lattice=default_lattice):
+    """
+    Prepares a thermalised state of temperature 'T'
+    by evolving the ground state for 'tmax_dt' timesteps 
+    in contact with a Langevin Heat Bath of friction 'gamma'
+    using 'LangevinStepper'
+    
+    If 'T' is an array of R temperatures, 
+    prepares an (R, N) ensemble with one replica per temperature
+    """
+    # prepare the ground state
+    shape = np.shape(T) + (lattice.N,)
+    f_old = -np.ones(shape, dtype=lattice.dtype)
+    f = -np.ones(shape, dtype=lattice.dtype)
+    
+    stepper = LangevinStepper(f_old, f, gamma, T, lattice)
+    for _ in range(tmax_dt):
+        stepper.next_timestep()
+    
+    return stepper.f_old, stepper.f
+
+
+def parallel_tempering(T_array, iter_max=100, sigma_factor=0.05, 
+                       swap_space=1, lattice=default_lattice):
+    """
+    Prepares thermalised states for every temperature of the ladder 
+    'T_array', in increasing order, as 'heat_bath' does for an array of 
+    temperatures, but every 'swap_space' iterations exchanges the states
+    of neighbouring temperatures T_i, T_i+1 with probability
+        min( 1, exp( (1/T_i - 1/T_i+1) * (E_i - E_i+1) ) ),
+    the total energies E measured using 'energy'
+    
+    Even and odd neighbour pairs are tried in turn, so hot states 
+    carry their disorder down the ladder and cold states are 
+    equilibrated through the hot ones. As E grows with N, swaps are only
+    accepted often for neighbouring temperatures closer than about
+    T / sqrt(N), e.g. a geometric ladder of a few dozen temperatures
+    per factor of 4 at N = 512.
+    
+    Returns
+    -------
+    f_old :       (R, N) ensemble of previous field configurations
+    f :           (R, N) ensemble of current field configurations
+    diagnostics : dictionary of 
+                  'attempts' and 'accepted', swaps tried and made
+                  between each neighbouring pair of temperatures,
+                  'acceptance', their ratio,
+                  'walkers', which starting state each temperature holds,
+                  'round_trips', the number of times a state has gone 
+                  from the coldest to the hottest temperature and back
+    """
+    T_array = np.asarray(T_array, dtype=float)
+    R = len(T_array)
+    sigma = sigma_factor * np.sqrt(T_array)
+    beta = 1 / T_array
+    
+    # prepare the ground state
+    f_old = -np.ones((R, lattice.N), dtype=lattice.dtype)
+    f = -np.ones((R, lattice.N), dtype=lattice.dtype)
+    
+    attempts = np.zeros(R - 1, dtype=int)
+    accepted = np.zeros(R - 1, dtype=int)
+    walkers = np.arange(R)
+    # +1 if a state last visited the coldest, -1 the hottest temperature
+    direction = np.zeros(R, dtype=int)
+    round_trips = 0
+    
+    # For a number of iterations
+    # Evolve in contact with the Heat Baths
+    for iter_num in range(iter_max):
+        f = heat_bath_iteration_vectorized(f_old, f, T_array, sigma, lattice)
+        
+        # evolve by a timestep
+        f_old, f = next_timestep(f_old, f, lattice)
+        
+        if (iter_num + 1) % swap_space != 0 or R < 2:
+            continue
+        
+        # exchange states of neighbouring temperatures
+        E = energy(f_old, f, lattice)[-1]
+        i = np.arange((iter_num // swap_space) % 2, R - 1, 2)
+        with np.errstate(over='ignore'):
+            swap = np.random.rand(len(i)) < np.exp( 
+                        (beta[i] - beta[i+1]) * (E[i] - E[i+1]) )
+        attempts[i] += 1
+        accepted[i[swap]] += 1
+        
+        i = i[swap]
+        for array in (f_old, f, walkers):
+            array[i], array[i+1] = array[i+1].copy(), array[i].copy()
+        
+        # count the returns to the coldest temperature
+        round_trips += int( direction[walkers[0]] == -1 )
+        direction[walkers[0]] = 1
+        direction[walkers[-1]] = -1
+        
+    diagnostics = { 'attempts': attempts, 'accepted': accepted,
+                    'acceptance': accepted / np.maximum(attempts, 1),
+                    'walkers': walkers, 'round_trips': round_trips }
+    return f_old, f, diagnostics
+
+
+def initial_fourier(scale, lattice=default_lattice):
+    """
+    Mimics the thermal spectrum of a thermalised state
+    Uses a Fourier transform to create an approximately thermalised state 
+    Will serve as experimental initial conditions
+    """
+    L, N, dt = lattice.L, lattice.N, lattice.dt
+    
+    # random phases
+    phases_1 = 2*np.pi*np.random.rand(N)
+    phases_2 = 2*np.pi*np.random.rand(N)
+    
+    # a range of amplitudes
+    amplitudes_1 = 1 / np.concatenate(
+                                      [100*np.ones(5), 
+                                      np.arange(6, (N//2)+1), 
+                                      np.arange((N//2), 0, -1)]
+                                      )
+    amplitudes_2 = 2 * np.pi / L
+    
+    # fourier transforms of these
+    z1 = np.fft.fft( amplitudes_1 * np.exp( 1j * phases_1 ) )
+    z2 = np.fft.fft( amplitudes_2 * np.exp( 1j * phases_2 ) )
+
+    # build initial conditions from these
+    f_old = -1 + scale * np.real(z1)
+    f =  f_old + scale * np.real(z2) * dt
+
+    return f_old, f
+
+
+def harmonic_frequencies(lattice=default_lattice):
+    """
+    Frequencies of the normal modes of equation (13) linearised about 
+    the vacuum f = -1, for the wavenumbers q = 2 pi m / N of 'np.fft.rfft'
+    
+    Returns
+    -------
+    omega : frequency of each mode
+    """
+    q = 2 * np.pi * np.arange(lattice.N // 2 + 1) / lattice.N
+    return np.sqrt( 4 * np.sin(q / 2)**2 / lattice.dx**2 + 2 * lattice.lamb )
+
+
+def thermal_state(T, correction_sweeps=0, sigma_factor=0.05,
+                  langevin_steps=0, gamma=1.0, lattice=default_lattice):
+    """
+    Samples a state of temperature 'T' from the harmonic approximation 
+    about the vacuum f = -1, using 'harmonic_frequencies' and 'np.fft'
+    
+    For each normal mode the timestep conserves 
+        (g - g_old)**2 / (2 dt**2) + omega**2 g g_old / 2,
+    so the mean (g + g_old) / 2 is drawn with variance T / omega**2 and
+    the momentum (g - g_old) / dt independently with variance 
+    T / (1 - (omega dt / 2)**2); the harmonic part of the state is then
+    stationary under 'next_timestep'
+    
+    The anharmonic part is corrected by 'correction_sweeps' iterations
+    of the Metropolis Hastings Algorithm, as in 'heat_bath' 
+    but starting from the sampled state, 
+    and/or by 'langevin_steps' timesteps with friction 'gamma'
+    using 'LangevinStepper'
+    
+    If 'T' is an array of R temperatures, 
+    samples an (R, N) ensemble with one replica per temperature
+    
+    Returns
+    -------
+    f_old : previous field configuration
+    f :     current field configuration
+    """
+    shape = np.shape(T) + (lattice.N,)
+    scale = np.sqrt( np.expand_dims(T, -1) )
+    omega = harmonic_frequencies(lattice)
+    
+    def shaped_noise(amplitudes):
+        # white noise shaped by the spectrum 'amplitudes'
+        # the orthonormal transform keeps its variance in each mode
+        noise = np.fft.rfft( np.random.normal(size=shape), norm='ortho' )
+        return np.fft.irfft( noise * amplitudes, n=lattice.N, norm='ortho' )
+    
+    mean = scale * shaped_noise( 1 / omega )
+    momentum = scale * shaped_noise( 1 / np.sqrt(1 - (omega*lattice.dt/2)**2) )
+    
+    f = ( -1 + mean + momentum * lattice.dt / 2 ).astype(lattice.dtype)
+    f_old = ( -1 + mean - momentum * lattice.dt / 2 ).astype(lattice.dtype)
+    
+    # Evolve in contact with a Heat Bath
+    sigma = sigma_factor * np.sqrt(T)
+    for iter_num in range(correction_sweeps):
+        f = heat_bath_iteration_vectorized(f_old, f, T, sigma, lattice)
+        f_old, f = next_timestep(f_old, f, lattice)
+    
+    # Evolve in contact with a Langevin Heat Bath
+    if langevin_steps > 0:
+        stepper = LangevinStepper(f_old, f, gamma, T, lattice)
+        for _ in range(langevin_steps):
+            stepper.next_timestep()
+        f_old, f = stepper.f_old, stepper.f
+    
+    return f_old, f
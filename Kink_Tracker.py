@@ -0,0 +1,208 @@
+"""
+Defines classes to follow kinks and anti-kinks from frame to frame:
+
+WorldLine
+KinkTracker
+
+and the function:
+
+track_kinks
+
+As in 'pairs', the zero-crossings split the field into blocks;
+a block holding a run of f > h_kink at least w_kink nodes long is a kink,
+one holding a run of f < - h_kink an anti-kink.
+Between frames a block's walls move by at most a few nodes, far fewer
+than its width, so each block overlaps the block it was a frame earlier;
+following the overlaps gives each kink and anti-kink a world-line.
+"""
+from Discretisation import np, default_lattice, Stepper
+from Kinks_and_Creations import h_kink, w_kink, long_run_ends, \
+                                pairs_from_events
+
+
+class WorldLine:
+    """
+    The history of one kink ('sign' +1) or anti-kink ('sign' -1)
+
+    Attributes
+    ----------
+    sign :         +1 for a kink, -1 for an anti-kink
+    creation :     first frame it was detected
+    annihilation : first frame it was no longer detected,
+                   None while it is still alive
+    frames :       list of the frames it was detected in
+    starts :       list of the first node of its block in each frame
+    stops :        list of the node after the end of its block,
+                   wrapping around, in each frame
+    """
+    def __init__(self, sign, frame, start, stop):
+        self.sign = sign
+        self.creation = frame
+        self.annihilation = None
+        self.frames = [frame]
+        self.starts = [start]
+        self.stops = [stop]
+
+    def lifetime(self):
+        """
+        Number of frames it was alive, up to the last frame fed if alive
+        """
+        return self.frames[-1] + 1 - self.creation
+
+    def centres(self, N):
+        """
+        Centre of its block in each frame, on a ring of 'N' nodes
+        """
+        starts, stops = np.array(self.starts), np.array(self.stops)
+        return ( starts + (stops - starts) % N / 2 ) % N
+
+
+class KinkTracker:
+    """
+    Detects the kinks and anti-kinks of one field configuration per frame,
+    counting pairs as 'pairs', and follows them between frames
+
+    Every block of the current frame is matched to the block of the
+    previous frame of the same sign it overlaps most, each at most once;
+    matched blocks continue a world-line, the others begin new ones,
+    and world-lines left unmatched end.
+    """
+    def __init__(self, lattice=default_lattice):
+        self.lattice = lattice
+        self.frame = -1
+        self.world_lines = []       # every world-line, in order of creation
+        self._alive = {}            # block of the last frame: world-line
+        self._labels = np.full(lattice.N, -1)   # block of each node
+
+    def _blocks(self, f):
+        """
+        Finds the zero-crossings of 'f', each starting a block,
+        and which blocks hold kink and anti-kink runs
+        using 'long_run_ends'; the runs are only searched for
+        if there are zero-crossings
+
+        Returns
+        -------
+        zeros :     indices of the zero-crossings
+        kink :      whether each block holds a kink run
+        anti_kink : whether each block holds an anti-kink run
+        pairs :     pair number, as 'pairs'
+        """
+        n = len(f)
+        zeros = np.flatnonzero( f * np.roll(f, 1) < 0 )
+        kink = np.zeros(len(zeros), dtype=bool)
+        anti_kink = np.zeros(len(zeros), dtype=bool)
+
+        #   without zero-crossings there are no blocks
+        if len(zeros) == 0:
+            return zeros, kink, anti_kink, 0
+
+        kink_ends = np.flatnonzero( long_run_ends( f > h_kink, w_kink ) )
+        anti_kink_ends = np.flatnonzero( long_run_ends( f < -h_kink, w_kink ) )
+
+        #   the block of each end, wrapping around before the first zero
+        kink[ np.searchsorted(zeros, kink_ends, side='right') - 1 ] = True
+        anti_kink[ np.searchsorted(zeros, anti_kink_ends, side='right') - 1 ] \
+            = True
+
+        n_pairs = pairs_from_events( zeros, kink_ends, anti_kink_ends, 1, n )
+        return zeros, kink, anti_kink, int( n_pairs[0] )
+
+    def feed(self, f):
+        """
+        Adds the field configuration 'f' of the next frame
+
+        Returns
+        -------
+        n : pair number of the frame, as 'pairs'
+        """
+        self.frame += 1
+        N = self.lattice.N
+        zeros, kink, anti_kink, n_pairs = self._blocks( f )
+
+        #   without blocks, every world-line ends
+        if len(zeros) == 0:
+            for world_line in self._alive.values():
+                world_line.annihilation = self.frame
+            self._alive = {}
+            self._labels[:] = -1
+            return n_pairs
+
+        #   label every node with the detected block it lies in
+        sign = np.where( kink, 1, np.where(anti_kink, -1, 0) )
+        labels = np.full(N, -1)
+        lengths = np.diff( np.append(zeros, zeros[0] + N) )
+        block_of_node = np.repeat( np.arange(len(zeros)), lengths )
+        nodes = np.arange(zeros[0], zeros[0] + N) % N
+        labels[nodes] = np.where( sign[block_of_node] != 0, block_of_node, -1 )
+
+        #   overlaps of every new block with every previous block
+        both = (labels >= 0) & (self._labels >= 0)
+        keys, overlaps = np.unique( labels[both] * (N + 1) +
+                                   self._labels[both], return_counts=True )
+
+        #   match the largest overlaps first, one to one, of the same sign
+        alive = {}
+        for key in keys[ np.argsort(-overlaps, kind='stable') ]:
+            new, old = divmod( int(key), N + 1 )
+            if new in alive or old not in self._alive:
+                continue
+            world_line = self._alive[old]
+            if world_line.sign != sign[new]:
+                continue
+            alive[new] = self._alive.pop(old)
+
+        #   world-lines without a block end
+        for world_line in self._alive.values():
+            world_line.annihilation = self.frame
+
+        #   continue matched world-lines, begin new ones
+        for block in np.flatnonzero( sign ):
+            start = int( zeros[block] )
+            stop = int( zeros[(block + 1) % len(zeros)] )
+            if block in alive:
+                world_line = alive[block]
+                world_line.frames.append( self.frame )
+                world_line.starts.append( start )
+                world_line.stops.append( stop )
+            else:
+                world_line = WorldLine( int(sign[block]), self.frame,
+                                        start, stop )
+                self.world_lines.append( world_line )
+                alive[int(block)] = world_line
+
+        self._alive = { int(block): world_line
+                        for block, world_line in alive.items() }
+        self._labels = labels
+        return n_pairs
+
+    def lifetimes(self, sign=1, finished=True):
+        """
+        Lifetimes (frames) of the world-lines of 'sign',
+        only those already annihilated if 'finished'
+        """
+        return np.array([ w.lifetime() for w in self.world_lines
+                          if w.sign == sign and
+                          (w.annihilation is not None or not finished) ])
+
+
+def track_kinks(f_old, f, num_frames, lattice=default_lattice):
+    """
+    Evolves 'f_old', 'f' for 'num_frames' frames
+    using 'Stepper'
+    following kinks and anti-kinks every frame
+    using 'KinkTracker'
+
+    Returns
+    -------
+    tracker :     'KinkTracker' holding the world-lines
+    pairs_array : pair number of each frame
+    """
+    stepper = Stepper(f_old, f, lattice)
+    tracker = KinkTracker(lattice)
+    pairs_array = np.zeros(num_frames, dtype=int)
+
+    for j in range( num_frames ):
+        pairs_array[j] = tracker.feed( stepper.next_frame()[1] )
+
+    return tracker, pairs_array
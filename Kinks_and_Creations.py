@@ -6,15 +6,27 @@ zero_crossings
 zeros_and_wide_gaps
 kink_in_block
 anti_kink_in_block
+pairs_loop
+long_run_ends
+pairs_from_events
 pairs
+kink_frames
+smooth_loop
+smooth_pass
 smooth
 creations
 creation_rates
 
+Defines the class:
+
+CreationCounter
+
 Defines the variables:
 w_kink, h_kink, d_kink, d_kink_frame, buff_frame
 """
-from Discretisation import np, N, dx, dt, frame_space
+from collections import deque
+
+from Discretisation import np, default_lattice
 from Initial_Conditions import heat_bath
                          
 # kink variables
@@ -22,11 +34,24 @@ w_kink = 20                 # minimum width of kink (nodes)
 h_kink = 0.5                # minimum height of a kink 
 d_kink = 50                 # minimum duration of kink (time-steps)
 
-# can also be expressed in frames
-d_kink_frame = d_kink // frame_space
 
-# a buffer period required to use smooth properly
-buff_frame = d_kink_frame * (d_kink_frame - 1)//2
+def kink_frames( lattice=default_lattice ):
+    """
+    Expresses the minimum duration of a kink in frames of the 'lattice'
+    
+    Returns
+    -------
+    d_kink_frame : minimum duration of kink (frames)
+    buff_frame :   a buffer period required to use smooth properly (frames)
+    """
+    d_kink_frame = d_kink // lattice.frame_space
+    buff_frame = d_kink_frame * (d_kink_frame - 1)//2
+    return d_kink_frame, buff_frame
+
+
+# can also be expressed in frames
+# with a buffer period required to use smooth properly
+d_kink_frame, buff_frame = kink_frames()
 
 
 def zero_crossings( f ):
@@ -35,46 +60,55 @@ def zero_crossings( f ):
     Returns the indices of the array 'f' where the array value 
     differs in sign to its predecessor
     
+    For an (R, N) ensemble returns a list of the R per-replica index arrays
+    
     Assumes array is non-zero
     """
-    return np.where( f * np.roll(f,1) < 0)[0]
+    crossings = f * np.roll(f, 1, axis=-1) < 0
+    if f.ndim == 1:
+        return np.where( crossings )[0]
+    
+    #   the nodes of every row at once, split by row
+    nodes = np.nonzero( crossings )[1]
+    counts = np.count_nonzero( crossings, axis=-1 )
+    return np.split( nodes, np.cumsum( counts )[:-1] )
 
 
 def zeros_and_wide_gaps( f ):
     """
     Returns number of zero-crossings and wide gaps
     as described in section 4.2
-    using 'zero_crossings''
+    
+    The blocks between successive zero-crossings, the last wrapping 
+    around to the first, are wide gaps if at least w_kink nodes long;
+    their lengths are found for every row at once with 'np.diff'
+    
+    For an (R, N) ensemble returns arrays of the R per-replica counts
     """
-    zeros = zero_crossings( f )
+    fields = np.atleast_2d( f )
+    R, n = fields.shape
+    crossings = fields * np.roll(fields, 1, axis=-1) < 0
     
-    #   if no zero-crossings, return no wide gaps
-    z = len(zeros)
-    if z == 0:
-        return 0, 0
+    #   zero-crossings of each row, as flat indices in row order
+    z = np.count_nonzero( crossings, axis=-1 )
+    zeros = np.flatnonzero( crossings )
+    rows = zeros // n
     
-    #   else split into blocks
-    #   search for a block that is a wide gap
-    gap_count = 0
+    #   length of each block up to the next zero-crossing of its row
+    lengths = np.diff( zeros )
+    same_row = rows[1:] == rows[:-1]
+    gap_count = np.bincount( rows[1:][ same_row & (lengths >= w_kink) ], 
+                            minlength=R )
     
-  
-    #   define boundary section
-    block = np.append( np.arange(zeros[-1], N), np.arange(0, zeros[0]))
+    #   the boundary block of each row with zero-crossings, wrapping around
+    has_zeros = z > 0
+    last = np.cumsum( z ) - 1
+    first = last - z + 1
+    boundary = zeros[ first[has_zeros] ] + n - zeros[ last[has_zeros] ]
+    gap_count[has_zeros] += boundary >= w_kink
     
-    # if passes width requirement, increase count
-    if len(block) >= w_kink:
-        gap_count += 1
-            
-    #   every other section
-    for i in range( 1, z ):
-        
-        #   define section
-        block = np.arange(zeros[i-1], zeros[i])
-        
-        # if passes width requirement, increase count
-        if len(block) >= w_kink:
-            gap_count += 1
-
+    if f.ndim == 1:
+        return int( z[0] ), int( gap_count[0] )
     return z, gap_count
     
     
@@ -138,13 +172,19 @@ def anti_kink_in_block( block, f ):
     return False
 
 
-def pairs( f ):
+def pairs_loop( f ):
     """
     Calculates the pair number 'n'
     Using the procedure described in 4.3 
     using 'zero_crossings', 'kink_in_block' and 'anti_kink_in_block'
+    
+    Reference implementation of 'pairs', walking every block node by node
 
+    For an (R, N) ensemble returns an array of the R per-replica pair numbers
     """
+    if f.ndim > 1:
+        return np.array([ pairs_loop( row ) for row in f ])
+    
     # identify all zero-crossings
     zeros = zero_crossings( f )
     
@@ -171,7 +211,7 @@ def pairs( f ):
         if i == 0:
             # due to periodic boundary conitions,
             # boundary block is defined differently 
-            block = np.append( np.arange(zeros[-1], N), \
+            block = np.append( np.arange(zeros[-1], len(f)), \
                               np.arange(0, zeros[0]))
         else:
             block = np.arange(zeros[i-1], zeros[i])
@@ -212,12 +252,126 @@ def pairs( f ):
     #   return the minimum; the number of pairs
     return min( kink_count, anti_kink_count )
 
+
+def long_run_ends( mask, width ):
+    """
+    Marks every node of the periodic boolean 'mask' that ends 
+    a run of at least 'width' consecutive True values 
+    (the node and the 'width' - 1 nodes before it are all True)
+    
+    Works along the last axis of an (R, N) ensemble of masks
+    """
+    n = mask.shape[-1]
+    
+    # prepend the last 'width' - 1 nodes, so runs can wrap around
+    extended = np.concatenate( (mask[..., n-width+1:], mask), axis=-1 )
+    counts = np.cumsum( extended, axis=-1 )
+    counts = np.concatenate( (np.zeros_like(counts[..., :1]), counts), 
+                            axis=-1 )
+    
+    #   number of True values in each window of 'width' nodes
+    return counts[..., width:] - counts[..., :n] == width
+
+
+def pairs_from_events( zeros, kink_ends, anti_kink_ends, R, n ):
+    """
+    Calculates the pair numbers of R fields of n nodes 
+    from the flat indices (row * n + node) of their zero-crossings 
+    and of the ends of their kink and anti-kink runs
+    
+    Each zero-crossing starts a block running up to the next zero-crossing
+    of the same row; the blocks of a row are searched in the order of 
+    'pairs_loop', with the alternation of section 4.3:
+    every anti-kink is counted, but a kink is only counted if it is the
+    first detection of the row or the previous detection was an anti-kink
+    
+    Returns
+    -------
+    n_pairs : array of the R pair numbers
+    """
+    z = len(zeros)
+    if z == 0:
+        return np.zeros(R, dtype=int)
+    
+    #   the zero-crossings of each row
+    rows = zeros // n
+    z_row = np.bincount( rows, minlength=R )
+    first = np.cumsum( z_row ) - z_row
+    last = first + z_row - 1
+    
+    def blocks( ends ):
+        # the zero-crossing starting the block containing each end
+        block = np.searchsorted( zeros, ends, side='right' ) - 1
+        end_rows = ends // n
+        
+        # before the first zero-crossing of a row,
+        # due to periodic boundary conditions, the block wraps around
+        # and is started by the last zero-crossing of the row
+        wrap = block < first[end_rows]
+        block[wrap] = last[end_rows[wrap]]
+        return block[ z_row[end_rows] > 0 ]
+    
+    kink = np.zeros(z, dtype=bool)
+    kink[ blocks( kink_ends ) ] = True
+    anti_kink = np.zeros(z, dtype=bool)
+    anti_kink[ blocks( anti_kink_ends ) ] = True
+    
+    #   search order of each row: the wrap-around block first, then the rest
+    order = np.arange(z) - 1
+    has_zeros = z_row > 0
+    order[ first[has_zeros] ] = last[has_zeros]
+    kink = kink[order]
+    anti_kink = anti_kink[order]
+    
+    #   the latest block before each block with any detection in it
+    #   within a block a kink is searched for before an anti-kink
+    detected = np.where( kink | anti_kink, np.arange(z), -1 )
+    previous = np.concatenate( ([-1], np.maximum.accumulate(detected)[:-1]) )
+    new_row = previous < first[rows]
+    
+    kink_count = np.bincount( rows[ kink & (new_row | anti_kink[previous]) ],
+                             minlength=R )
+    anti_kink_count = np.bincount( rows[ anti_kink ], minlength=R )
+    
+    #   return the minimum; the number of pairs
+    return np.minimum( kink_count, anti_kink_count )
+
+
+def pairs( f ):
+    """
+    Calculates the pair number 'n'
+    Using the procedure described in 4.3 
+    using 'long_run_ends' and 'pairs_from_events'
+    
+    Vectorized equivalent of 'pairs_loop': kinks and anti-kinks are found 
+    as runs of f > h_kink and f < - h_kink at least w_kink nodes long
+
+    For an (R, N) ensemble returns an array of the R per-replica pair numbers
+    """
+    fields = np.atleast_2d( f )
+    R, n = fields.shape
+    
+    #   flat indices of zero-crossings, ends of kink and anti-kink runs
+    zeros = np.flatnonzero( fields * np.roll(fields, 1, axis=-1) < 0 )
+    kink_ends = np.flatnonzero( long_run_ends( fields > h_kink, w_kink ) )
+    anti_kink_ends = np.flatnonzero( 
+                        long_run_ends( fields < -h_kink, w_kink ) )
+    
+    n_pairs = pairs_from_events( zeros, kink_ends, anti_kink_ends, R, n )
+    if f.ndim == 1:
+        return int( n_pairs[0] )
+    return n_pairs
+
 #   Kink-count Smoothing
-def smooth(array, tmax_frame):
+def smooth_loop(array, tmax_frame, lattice=default_lattice):
     """
     Removes fluctuations of duration less than 'd_min' from an array
     according to the procedure described in section 5.1
+    
+    Reference implementation of 'smooth', modifies 'array' in place
     """
+    d_kink_frame = kink_frames( lattice )[0]
+    
     #   for each duration 'd' up to the minimum acceptable
     for d in range(1, d_kink_frame ):
         #   remove, left to right, all fluctuations of duration 'n'
@@ -230,23 +384,76 @@ def smooth(array, tmax_frame):
                 array[k] = array[k + d]
                 
     return array[: tmax_frame ]
+
+
+def smooth_pass(array, d):
+    """
+    Returns a copy of 'array' with, left to right, all fluctuations of 
+    duration 'd' removed, exactly as one pass of 'smooth_loop':
+    
+    new[k] = array[k] if array[k] == new[k-1] else array[k+d]
+    
+    Each new[k] is either array[k] (state 0) or array[k+d] (state 1), 
+    so every step of the recurrence maps the previous state to the next
+    by one of: constant 0, constant 1, identity or swap. The state is then
+    the last constant, flipped once per swap since; found with cumulative 
+    sums rather than a loop.
+    """
+    # the nodes before the respective buffer
+    stop = len(array) - d * (d + 1)//2
+    new = array.copy()
+    if stop < 2:
+        return new
+    
+    # next state from state 0 (value array[k-1]) and state 1 (array[k-1+d])
+    next_0 = array[:stop-1] != array[1:stop]
+    next_1 = array[d:stop-1+d] != array[1:stop]
     
+    # node 0 is never changed, it is constant state 0
+    constant = np.concatenate( ([True], next_0 == next_1) )
+    value = np.concatenate( ([False], next_0) )
+    swaps = np.cumsum( np.concatenate( ([False], next_0 & ~next_1) ) )
     
-def creations(array, tmax_frame):
+    # the last constant at or before each node, then flip for each swap
+    last = np.maximum.accumulate( np.where(constant, np.arange(stop), 0) )
+    state = value[last] ^ ( (swaps - swaps[last]) % 2 == 1 )
+    
+    new[:stop] = np.where( state, array[d:stop+d], array[:stop] )
+    return new
+
+
+def smooth(array, tmax_frame, lattice=default_lattice):
+    """
+    Removes fluctuations of duration less than 'd_min' from an array
+    according to the procedure described in section 5.1
+    using 'smooth_pass'
+    
+    Vectorized equivalent of 'smooth_loop', leaves 'array' unchanged
+    """
+    d_kink_frame = kink_frames( lattice )[0]
+    
+    #   for each duration 'd' up to the minimum acceptable
+    for d in range(1, d_kink_frame ):
+        #   remove, left to right, all fluctuations of duration 'd'
+        array = smooth_pass(array, d)
+        
+    return array[: tmax_frame ]
+    
+    
+def creations(array, tmax_frame, lattice=default_lattice):
     """
     Calculates the number of creations that occurred in this time-frame
     given the array of pair numbers over (tmax_frame + buff_frame) frames
     using the procedure described in section 5.1
     using 'smooth'
     """
-    s_array = smooth(array, tmax_frame)
+    s_array = smooth(array, tmax_frame, lattice)
     #   count the upward steps
-    diff = [max(y - x, 0) for x, y in zip(s_array[:-1], s_array[1:])]
-    amount = sum( diff )
+    amount = np.sum( np.maximum( np.diff(s_array), 0 ) )
     return amount
 
 
-def creation_rates( pair_array, tmax_frame ):
+def creation_rates( pair_array, tmax_frame, lattice=default_lattice ):
     """
     Calculates the creation time 'tau' and creation rate 'Gamma'
     given the array of pair numbers over (tmax_frame + buff_frame) frames
@@ -257,9 +464,77 @@ def creation_rates( pair_array, tmax_frame ):
     # 1 frame is 'frame_space' timesteps
     # 1 timestep is 'dt' time units
     # therefore one frame is 'frame_space' * dt time units
-    tmax_units = frame_space * dt * tmax_frame
-    creation_amount = creations(pair_array, tmax_frame)
+    tmax_units = lattice.frame_space * lattice.dt * tmax_frame
+    creation_amount = creations(pair_array, tmax_frame, lattice)
     
     tau =  tmax_units / creation_amount
     Gamma = creation_amount / tmax_units 
-    return Gamma, tau
\ No newline at end of file
+    return Gamma, tau
+
+
+class CreationCounter:
+    """
+    Streaming equivalent of 'creations'
+    
+    Takes pair numbers one frame at a time and smooths them with one
+    stage per pass of 'smooth'; the stage removing fluctuations of 
+    duration 'd' holds a lookahead window of d + 1 frames, 
+    so in total a frame is final after 'buff_frame' more frames.
+    Upward steps of the final frames are counted as they appear,
+    using constant memory however long the run.
+    
+    After (tmax_frame + buff_frame) frames, 'creations' equals 
+    'creations' of the array of those pair numbers.
+    """
+    def __init__(self, lattice=default_lattice):
+        self.lattice = lattice
+        d_kink_frame = kink_frames( lattice )[0]
+        
+        # for each duration, a window of pending frames and the last output
+        self._windows = [ deque() for d in range(1, d_kink_frame) ]
+        self._last = [ None for d in range(1, d_kink_frame) ]
+        
+        self.frames = 0         # number of final frames
+        self.creations = 0      # number of creations over these frames
+
+    def feed(self, n):
+        """
+        Adds the pair number 'n' of the next frame
+        
+        Returns
+        -------
+        creations : number of creations over the final frames
+        """
+        for d, window in enumerate( self._windows, start=1 ):
+            window.append( n )
+            
+            # frame k of this stage needs the frame d nodes in the future
+            if len( window ) <= d:
+                return self.creations
+            k = window.popleft()
+            
+            #   if it doesn't match its predecessor
+            #   set it to the value 'd' frames in the future
+            last = self._last[d-1]
+            if last is not None and k != last:
+                k = n
+            self._last[d-1] = k
+            n = k
+            
+        #   count the upward step of this final frame
+        if self.frames > 0:
+            self.creations += max( n - self._final, 0 )
+        self._final = n
+        self.frames += 1
+        return self.creations
+
+    def creation_rates(self):
+        """
+        Calculates the creation time 'tau' and creation rate 'Gamma'
+        over the final frames, as 'creation_rates'
+        """
+        tmax_units = self.lattice.frame_space * self.lattice.dt * self.frames
+        
+        tau =  tmax_units / self.creations
+        Gamma = self.creations / tmax_units 
+        return Gamma, tau
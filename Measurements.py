@@ -0,0 +1,238 @@
+"""
+Defines a measurement engine which evolves one thermalised state and
+runs any set of observers on the same frames, so that a single run
+gives the results of several of the tests of Test_Functions:
+
+register
+measure
+
+and the classes:
+
+Frame
+Energy
+ZerosAndWideGaps
+Pairs
+Creations
+
+Observers are registered by name in 'observers':
+
+energy :              average total energy, as measured by the tests
+zeros_and_wide_gaps : average numbers of zero-crossings and wide gaps,
+                      as 'zeros_and_wide_gaps_test'
+pairs :               average pair number, as 'pairs_test'
+creations :           creation rate and time, as 'Gamma_and_tau_test'
+
+An observer is a class taking (tmax_frame, e_tests, series, lattice),
+with an attribute 'extra_frames', the frames it needs beyond
+'tmax_frame', a method feed(frame) called with the 'Frame' of every
+frame it needs, and a method result() returning a dictionary of values.
+"""
+import functools
+
+from Discretisation import np, default_lattice, energy
+from Backends import next_frame
+from Initial_Conditions import heat_bath
+from Kinks_and_Creations import zeros_and_wide_gaps, pairs, kink_frames, \
+                                CreationCounter
+
+
+observers = {}      # name: observer class
+
+
+def register(name):
+    """
+    Decorator adding an observer class to the registry as 'name'
+    """
+    def decorator(observer):
+        observers[name] = observer
+        return observer
+    return decorator
+
+
+class Frame:
+    """
+    The field configurations 'f_old', 'f' of frame 'index'
+
+    Quantities needed by several observers are computed on first use
+    and then shared.
+    """
+    def __init__(self, f_old, f, index, lattice=default_lattice):
+        self.f_old = f_old
+        self.f = f
+        self.index = index
+        self.lattice = lattice
+
+    @functools.cached_property
+    def energy(self):
+        """
+        K, I, P, E of the frame, as 'energy'
+        """
+        return energy(self.f_old, self.f, self.lattice)
+
+    @functools.cached_property
+    def zeros_and_wide_gaps(self):
+        """
+        Numbers of zero-crossings and wide gaps, as 'zeros_and_wide_gaps'
+        """
+        return zeros_and_wide_gaps( self.f )
+
+    @functools.cached_property
+    def pairs(self):
+        """
+        Pair number, as 'pairs'
+        """
+        return pairs( self.f )
+
+
+@register('energy')
+class Energy:
+    """
+    Average total energy over 'e_tests' evenly spaced frames
+    """
+    extra_frames = 0
+
+    def __init__(self, tmax_frame, e_tests, series=False,
+                 lattice=default_lattice):
+        self.e_space = tmax_frame // e_tests
+        self.e_tests = e_tests
+        self.E = 0
+
+    def feed(self, frame):
+        # rarely evaluate energy
+        if frame.index % self.e_space == 0:
+            self.E += frame.energy[-1]
+
+    def result(self):
+        return { 'E_avg': self.E / self.e_tests }
+
+
+@register('zeros_and_wide_gaps')
+class ZerosAndWideGaps:
+    """
+    Average numbers of zero-crossings and wide gaps over every frame,
+    and if 'series' their per-frame series
+    """
+    extra_frames = 0
+
+    def __init__(self, tmax_frame, e_tests, series=False,
+                 lattice=default_lattice):
+        self.tmax_frame = tmax_frame
+        self.z = 0
+        self.g = 0
+        self.z_array = np.zeros( tmax_frame, dtype=int ) if series else None
+        self.g_array = np.zeros( tmax_frame, dtype=int ) if series else None
+
+    def feed(self, frame):
+        z_new, g_new = frame.zeros_and_wide_gaps
+        self.z += z_new
+        self.g += g_new
+        if self.z_array is not None:
+            self.z_array[frame.index] = z_new
+            self.g_array[frame.index] = g_new
+
+    def result(self):
+        result = { 'z_avg': self.z / self.tmax_frame,
+                   'g_avg': self.g / self.tmax_frame }
+        if self.z_array is not None:
+            result.update( z_array=self.z_array, g_array=self.g_array )
+        return result
+
+
+@register('pairs')
+class Pairs:
+    """
+    Average pair number over every frame,
+    and if 'series' its per-frame series
+    """
+    extra_frames = 0
+
+    def __init__(self, tmax_frame, e_tests, series=False,
+                 lattice=default_lattice):
+        self.tmax_frame = tmax_frame
+        self.n = 0
+        self.n_array = np.zeros( tmax_frame, dtype=int ) if series else None
+
+    def feed(self, frame):
+        n_new = frame.pairs
+        self.n += n_new
+        if self.n_array is not None:
+            self.n_array[frame.index] = n_new
+
+    def result(self):
+        result = { 'n_avg': self.n / self.tmax_frame }
+        if self.n_array is not None:
+            result.update( n_array=self.n_array )
+        return result
+
+
+@register('creations')
+class Creations:
+    """
+    Creation rate 'Gamma' and creation time 'tau' of the pair numbers,
+    streamed through 'CreationCounter', which needs 'buff_frame'
+    frames beyond 'tmax_frame'; without any creations
+    'Gamma' is 0 and 'tau' infinite
+    """
+    def __init__(self, tmax_frame, e_tests, series=False,
+                 lattice=default_lattice):
+        self.extra_frames = kink_frames( lattice )[1]
+        self.counter = CreationCounter( lattice )
+
+    def feed(self, frame):
+        self.counter.feed( frame.pairs )
+
+    def result(self):
+        # without creations, rather than fail the other observers
+        if self.counter.creations == 0:
+            return { 'Gamma': 0.0, 'tau': np.inf }
+        Gamma, tau = self.counter.creation_rates()
+        return { 'Gamma': Gamma, 'tau': tau }
+
+
+def measure( T, e_tests=1000, tmax_frame=10**5,
+             names=('energy', 'zeros_and_wide_gaps', 'pairs', 'creations'),
+             series=False, lattice=default_lattice ):
+    """
+    Prepares initial condition of temperature 'T'
+    according to the Metropolis-Hastings Algorithm
+    using 'heat_bath'
+    Evolves it for 'tmax_frame' frames, and as many more as the observers
+    need, using 'next_frame'
+    Feeds every frame to each of the observers called 'names'
+
+    Each observer sees the frames it would in its own test, so for the
+    same random state the results equal those of 'pairs_test',
+    'zeros_and_wide_gaps_test' and 'Gamma_and_tau_test', except that
+    the energy is only measured over the first 'tmax_frame' frames
+
+    As its arguments are those of the tests, 'measure' can be run over
+    temperatures by 'sweep', and its results kept in a 'ResultCache'
+
+    Returns
+    -------
+    results : dictionary of the values of every observer,
+              e.g. 'E_avg', 'z_avg', 'g_avg', 'n_avg', 'Gamma', 'tau'
+    """
+    running = [ observers[name](tmax_frame, e_tests, series, lattice)
+                for name in names ]
+    num_frames = tmax_frame + max( [o.extra_frames for o in running] + [0] )
+
+    # intial conditions of this temperature
+    f_old, f = heat_bath(T, lattice=lattice)
+
+    # for each frame until the last needed
+    for j in range( num_frames ):
+
+        # evolve to next frame
+        f_old, f = next_frame(f_old, f, lattice)
+
+        # on frame, feed the observers which need it
+        frame = Frame(f_old, f, j, lattice)
+        for observer in running:
+            if j < tmax_frame + observer.extra_frames:
+                observer.feed( frame )
+
+    results = {}
+    for observer in running:
+        results.update( observer.result() )
+    return results
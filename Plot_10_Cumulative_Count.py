@@ -3,31 +3,39 @@ Produces Figure 10
 
 Plots cumulative count of kink number over time
 """
-from Discretisation import np, plt, next_frame, energy, frame_space
-from Initial_Conditions import heat_bath
+from Discretisation import np, plt, energy
 from Kinks_and_Creations import pairs
+from Trajectories import load_or_record
 
 T = 1.0
 target = 10**4
+seed = 0                            # seed of the recorded trajectory
+path = 'trajectories/Plot_10'       # recorded once, replayed after
+num_frames = 2 * target             # frames recorded, doubled if too few
+chunk = 1000                        # frames counted at once
 
-f_old, f = heat_bath(T)
-E = int( energy(f_old, f)[-1] )
-cum_sum_pairs = np.array( [pairs(f)] )
-time_array_dt = np.array( [0] )
+while True:
+    trajectory = load_or_record(path, T, num_frames, seed, keep_f_old=True)
 
-while cum_sum_pairs[-1] < target:
-    
-    # evolve to next frame
-    f_old, f = next_frame(f_old, f)
-    time_array_dt = np.append( time_array_dt, \
-                              time_array_dt[-1] + frame_space)
-    cum_sum_pairs = np.append( cum_sum_pairs, \
-                              cum_sum_pairs[-1] + pairs(f))
-    print( str(cum_sum_pairs[-1]) +' out of ' +str(target))
+    # pair number of every recorded frame, as an ensemble per chunk
+    pairs_array = np.concatenate([ pairs( trajectory[j : j + chunk] )
+                                   for j in range(0, len(trajectory), chunk) ])
+    cum_sum_pairs = np.cumsum( pairs_array )
+
+    # until the first frame reaching the target
+    if cum_sum_pairs[-1] >= target:
+        last = np.argmax( cum_sum_pairs >= target )
+        break
+    num_frames *= 2
+
+cum_sum_pairs = cum_sum_pairs[: last + 1]
+time_array_dt = trajectory.time_array_dt()[: last + 1]
+E = int( energy(trajectory.f_old(0), trajectory[0])[-1] )
+print( str(cum_sum_pairs[-1]) +' out of ' +str(target))
 
 plt.figure()
 plt.title('Field prepared at Temperature ' +r'$T=$'+str(T) \
               +'\n Initial Energy '+r'$E=$'+str(E))
 plt.xlabel('Timesteps')
 plt.ylabel('Cumulative Sum of Pair Detections')
-plt.plot(time_array_dt, cum_sum_pairs, drawstyle='steps-post' )
\ No newline at end of file
+plt.plot(time_array_dt, cum_sum_pairs, drawstyle='steps-post' )
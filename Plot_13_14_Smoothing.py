@@ -3,24 +3,23 @@ Produces Figures 13 and 14
 
 Plots pair number over time, unsmoothed and smoothed
 """
-from Discretisation import np, plt, frame_space, next_frame, energy
-from Initial_Conditions import heat_bath
+from Discretisation import np, plt, frame_space, energy
 from Kinks_and_Creations import pairs, smooth,buff_frame
+from Trajectories import load_or_record
 
 T = 1.0
 tmax_frame = 200
+seed = 0                                # seed of the recorded trajectory
+path = 'trajectories/Plot_13_14'        # recorded once, replayed after
 
 time_array_dt = np.arange(0, (buff_frame+tmax_frame)*frame_space, frame_space)
 num_frames = len(time_array_dt)
-pairs_array = np.zeros( num_frames)
-f_old, f = heat_bath(T)
-E = 0
+trajectory = load_or_record(path, T, num_frames, seed, keep_f_old=True)
 
-for i in range(num_frames):
-    f_old, f = next_frame(f_old, f)
-    
-    pairs_array[i] = pairs(f)
-    E += energy(f_old, f)[-1]
+# every frame after the initial state
+f_old, f = trajectory.f_old(slice(1, num_frames+1)), trajectory[1:num_frames+1]
+pairs_array = pairs(f).astype(float)
+E = np.sum( energy(f_old, f)[-1] )
     
 print( 'Average Energy: '+str( E / num_frames ) )
 fig1, ax1 = plt.subplots()
@@ -6,27 +6,30 @@ Evolves for 'tmax' timesteps
 Plots 'num_frames' field configurations over this evolution
 """
 
-from Discretisation import np, plt, L, N, next_timestep, energy
-from Initial_Conditions import heat_bath
+from Discretisation import np, plt, L, N, frame_space, energy
+from Trajectories import load_or_record
 
 
 T = 1.0             # temperature
 tmax = 10**4        # max timesteps
 num_frames = 10     # number of plots
+seed = 0                            # seed of the recorded trajectory
+path = 'trajectories/Plot_1_5'      # recorded once, replayed after
 
 
 space = tmax // num_frames  # timesteps between plots
 axis = np.linspace(0,L,N)   # to plot field over
-f_old, f = heat_bath(T)     # intitial conditions
+trajectory = load_or_record(path, T, tmax // frame_space, seed, 
+                            keep_f_old=True)
 
 for i in range(num_frames):
     
     # progress bar
     print( str(i+1) + ' out of ' + str(num_frames))
     
-    # evolve over time
-    for _ in range(space):
-        f_old, f = next_timestep(f_old, f)
+    # field after the evolution, read from the recording
+    frame = (i+1) * space // frame_space
+    f_old, f = trajectory.f_old(frame), trajectory[frame]
     # measure energy
     E = int( energy(f_old, f)[-1] )
     
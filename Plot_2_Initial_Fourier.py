@@ -1,38 +1,11 @@
 """
 Produces Figure 2
 """
-from Discretisation import np, plt, L, N, dt, next_timestep, energy
+from Discretisation import np, plt, L, N, energy, next_timestep_energy
+from Initial_Conditions import initial_fourier
+from Scheduler import log_times, observe
 
 
-def initial_fourier(scale):
-    """
-    Mimics the thermal spectrum of a thermalised state
-    Uses a Fourier transform to create an approximately thermalised state 
-    Will serve as experimental initial conditions
-    """
-    # random phases
-    phases_1 = 2*np.pi*np.random.rand(N)
-    phases_2 = 2*np.pi*np.random.rand(N)
-    
-    # a range of amplitudes
-    amplitudes_1 = 1 / np.concatenate(
-                                      [100*np.ones(5), 
-                                      np.arange(6, (N//2)+1), 
-                                      np.arange((N//2), 0, -1)]
-                                      )
-    amplitudes_2 = 2 * np.pi / L
-    
-    # fourier transforms of these
-    z1 = np.fft.fft( amplitudes_1 * np.exp( 1j * phases_1 ) )
-    z2 = np.fft.fft( amplitudes_2 * np.exp( 1j * phases_2 ) )
-
-    # build initial conditions from these
-    f_old = -1 + scale * np.real(z1)
-    f =  f_old + scale * np.real(z2) * dt
-
-    return f_old, f
-                            
-                            
 scale = 0.8             # fourier 'scale' parameter
 iter_max = 250          # short term evolution 
 tmax_dt = 10**6         # long term evolution
@@ -72,15 +45,13 @@ E_array = np.zeros( iter_max )
 for iter_num in range( iter_max ):
     
     # Once per iteration, measure energies and store
-    K, I, P, E = energy(f_old, f)
+    # Evolve by one time-step
+    f_old, f, (K, I, P, E) = next_timestep_energy(f_old, f)
     K_array[iter_num] = K
     I_array[iter_num] = I
     P_array[iter_num] = P
     E_array[iter_num] = E
     
-    # Evolve by one time-step
-    f_old, f = next_timestep(f_old, f)
-    
 
         #   plot results
 fig = plt.figure(figsize=(12, 6), dpi=80)
@@ -97,35 +68,12 @@ ax1.plot(P_array, label = 'Potential term')
 
 
         # long term energy conservation ( logarithmic )
-time_array_dt = 10**np.linspace( 
-                    np.log10(iter_max), np.log10(tmax_dt), num_tests)
-
-# initialise arrays
-K_array = np.zeros( num_tests )
-I_array = np.zeros( num_tests )
-P_array = np.zeros( num_tests )
-E_array = np.zeros( num_tests )
-counter = iter_max
+time_array_dt = log_times( iter_max, tmax_dt, num_tests )
 
-# For each specified time
-for i, time_dt in enumerate( time_array_dt ):
-    
-    # progress bar
-    # inside loop since each step takes longer than last
-    print( str(counter) +' out of ' + str(tmax_dt), 
-          str(100*counter/tmax_dt)+'%')
-    
-    # evolve to next time
-    while counter < time_dt:
-        f_old, f = next_timestep( f_old, f )
-        counter += 1
-    
-    # At time, measure energies and store
-    K, I, P, E = energy(f_old, f)
-    K_array[i] = K
-    I_array[i] = I
-    P_array[i] = P
-    E_array[i] = E
+# For each specified time, evolve to it and measure energies
+f_old, f, results = observe( f_old, f, time_array_dt, {'energy': energy},
+                            start=iter_max )
+K_array, I_array, P_array, E_array = results['energy'].T
 
     
         #   plot results
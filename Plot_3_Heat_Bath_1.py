@@ -8,8 +8,9 @@ Returns plot of Energy Distribution over Time
 Evolves for long time period
 Returns plot of Energy Distribution over log of time
 """
-from Discretisation import np, plt, N, next_timestep, energy
+from Discretisation import np, plt, N, energy, next_timestep_energy
 from Initial_Conditions import heat_bath_iteration
+from Scheduler import log_times, observe
 
                             
 T = 1.0                 # temperature of heat bath
@@ -39,28 +40,24 @@ for iter_num in range(iter_max):
     f = heat_bath_iteration(f_old, f, T, sigma)
     
     # Once per iteration, measure energies, print and store
-    K, I, P, E = energy(f_old, f)
+    # evolve by a timestep
+    f_old, f, (K, I, P, E) = next_timestep_energy(f_old, f)
     K_array[iter_num] = K
     I_array[iter_num] = I
     P_array[iter_num] = P
     E_array[iter_num] = E
     
-    # evolve by a timestep
-    f_old, f = next_timestep(f_old, f)
-    
 #   For a number of iterations
 #   Evolve independent of Heat Bath
 for iter_num in range( iter_max, iter_max + iter_max2 ):
     
     # Once per iteration, measure energies and store
-    K, I, P, E = energy(f_old, f)
+    # Evolve by one time-step
+    f_old, f, (K, I, P, E) = next_timestep_energy(f_old, f)
     K_array[iter_num] = K
     I_array[iter_num] = I
     P_array[iter_num] = P
     E_array[iter_num] = E
-    
-    # Evolve by one time-step
-    f_old, f = next_timestep(f_old, f)
 
 
         # plot results
@@ -80,36 +77,12 @@ ax1.plot(P_array)
 
 
         # long term energy conservation ( logarithmic )
-time_array_dt = 10**np.linspace( 
-                    np.log10(iter_max), np.log10(tmax_dt), num_tests)
-
-# initialise arrays
-K_array = np.zeros( num_tests )
-I_array = np.zeros( num_tests )
-P_array = np.zeros( num_tests )
-E_array = np.zeros( num_tests )
-counter = iter_max
+time_array_dt = log_times( iter_max, tmax_dt, num_tests )
 
-# For each specified time
-for i, time_dt in enumerate( time_array_dt ):
-    
-    # evolve to next time
-    while counter < time_dt:
-        
-        # progress bar
-        # inside loop since each step takes longer than last
-        print( str(counter) +' out of ' + str(tmax_dt), 
-              str(100*counter/tmax_dt)+'%')
-        
-        f_old, f = next_timestep( f_old, f )
-        counter += 1
-    
-    # At time, measure energies and store
-    K, I, P, E = energy(f_old, f)
-    K_array[i] = K
-    I_array[i] = I
-    P_array[i] = P
-    E_array[i] = E
+# For each specified time, evolve to it and measure energies
+f_old, f, results = observe( f_old, f, time_array_dt, {'energy': energy},
+                            start=iter_max )
+K_array, I_array, P_array, E_array = results['energy'].T
 
     
         #   plot results
@@ -8,7 +8,7 @@ Attachs to cold heat bath
 Returns plot of energy of time
 Returns plot of 'frozen' kink
 """
-from Discretisation import np, plt, L, N, energy, next_timestep
+from Discretisation import np, plt, L, N, energy, next_timestep_energy
 from Initial_Conditions import heat_bath_iteration
 
                             
@@ -40,28 +40,24 @@ for iter_num in range(iter_max):
     f = heat_bath_iteration(f_old, f, T1, sigma1)
     
     # Once per iteration, measure energies, print and store
-    K, I, P, E = energy(f_old, f)
+    # evolve by a timestep
+    f_old, f, (K, I, P, E) = next_timestep_energy(f_old, f)
     K_array[iter_num] = K
     I_array[iter_num] = I
     P_array[iter_num] = P
     E_array[iter_num] = E
     
-    # evolve by a timestep
-    f_old, f = next_timestep(f_old, f)
-    
 #   For a number of iterations
 #   Evolve independent of Heat Bath
 for iter_num in range( iter_max, iter_max + iter_max2 ):
     
     # Once per iteration, measure energies and store
-    K, I, P, E = energy(f_old, f)
+    # Evolve by one time-step
+    f_old, f, (K, I, P, E) = next_timestep_energy(f_old, f)
     K_array[iter_num] = K
     I_array[iter_num] = I
     P_array[iter_num] = P
     E_array[iter_num] = E
-    
-    # Evolve by one time-step
-    f_old, f = next_timestep(f_old, f)
 
 
 fig1, ax1 = plt.subplots()
@@ -85,14 +81,12 @@ for iter_num in range( iter_max + iter_max2, \
     f = heat_bath_iteration(f_old, f, T2, sigma2)
     
     # Once per iteration, measure energies, print and store
-    K, I, P, E = energy(f_old, f)
+    # evolve by a timestep
+    f_old, f, (K, I, P, E) = next_timestep_energy(f_old, f)
     K_array[iter_num] = K
     I_array[iter_num] = I
     P_array[iter_num] = P
     E_array[iter_num] = E
-    
-    # evolve by a timestep
-    f_old, f = next_timestep(f_old, f)
 
         # plot results
 fig2, ax2 = plt.subplots()
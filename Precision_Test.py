@@ -0,0 +1,137 @@
+"""
+Accuracy of single precision simulation
+
+Compares np.float32 fields against np.float64 fields started from the same
+thermalised state:
+    long-term energy drift, measured at logarithmically spaced times
+    as in Figure 2,
+    average pair number, creation rate and creation time.
+
+Defines functions:
+
+energy_drift
+pair_statistics
+compare_precision
+"""
+from Discretisation import np, Lattice, next_frame_fused, energy
+from Initial_Conditions import heat_bath
+from Kinks_and_Creations import pairs, CreationCounter, kink_frames
+from Scheduler import observe
+
+
+T = 1.0                 # temperature
+iter_max = 250          # first measurement (timesteps)
+tmax_dt = 10**6         # long term evolution
+num_tests = 1000        # number of energy measurements in long term
+tmax_frame = 10**4      # frames for pair statistics
+seed = 0                # seed of the initial state
+
+
+def energy_drift( f_old, f, lattice, iter_max, tmax_dt, num_tests ):
+    """
+    Evolves 'f_old', 'f' for 'tmax_dt' timesteps on the 'lattice'
+    using 'observe', which steps with 'fused_steps',
+    measuring the total energy at 'num_tests' logarithmically spaced times
+    from 'iter_max', accumulated in np.float64,
+    using 'energy'
+
+    Returns
+    -------
+    time_array_dt : times of measurements (timesteps)
+    drift :         relative change of the total energy since time 0
+    """
+    f_old = f_old.astype(lattice.dtype)
+    f = f.astype(lattice.dtype)
+    E_0 = energy(f_old, f, lattice, np.float64)[-1]
+
+    time_array_dt = np.unique( np.ceil( 10**np.linspace(
+                        np.log10(iter_max), np.log10(tmax_dt), num_tests) ) )
+
+    # For each specified time, evolve to it and measure energy
+    f_old, f, results = observe( f_old, f, time_array_dt,
+            { 'E': lambda f_old, f: energy(f_old, f, lattice, np.float64)[-1] },
+            progress_seconds=None, lattice=lattice )
+    E_array = results['E']
+
+    return time_array_dt, (E_array - E_0) / E_0
+
+
+def pair_statistics( f_old, f, lattice, tmax_frame ):
+    """
+    Evolves 'f_old', 'f' for 'tmax_frame' frames on the 'lattice'
+    using 'next_frame_fused'
+    measuring pair numbers every frame, and creations,
+    using 'pairs' and 'CreationCounter'
+
+    Returns
+    -------
+    n_avg :   average number of pairs
+    Gamma :   creation rate
+    tau   :   creation time
+    """
+    f_old = f_old.astype(lattice.dtype)
+    f = f.astype(lattice.dtype)
+    counter = CreationCounter(lattice)
+    n = 0
+
+    for j in range( tmax_frame + kink_frames(lattice)[1] ):
+        f_old, f = next_frame_fused(f_old, f, lattice)
+        n_new = pairs( f )
+        counter.feed( n_new )
+        if j < tmax_frame:
+            n += n_new
+
+    # without creations the rates are undefined
+    Gamma, tau = np.nan, np.nan
+    if counter.creations > 0:
+        Gamma, tau = counter.creation_rates()
+
+    return n / tmax_frame, Gamma, tau
+
+
+def compare_precision( T, iter_max, tmax_dt, num_tests, tmax_frame, seed ):
+    """
+    Prepares an initial condition of temperature 'T' in double precision
+    using 'heat_bath'
+    then runs 'energy_drift' and 'pair_statistics'
+    from it in double and single precision
+
+    Returns
+    -------
+    results : dictionary of the results of each, keyed by dtype name
+    """
+    np.random.seed(seed)
+    f_old, f = heat_bath(T)
+
+    results = {}
+    for dtype in (np.float64, np.float32):
+        lattice = Lattice(dtype=dtype)
+        time_array_dt, drift = energy_drift(f_old, f, lattice,
+                                            iter_max, tmax_dt, num_tests)
+        n_avg, Gamma, tau = pair_statistics(f_old, f, lattice, tmax_frame)
+        results[np.dtype(dtype).name] = { 'time_array_dt': time_array_dt,
+                                          'drift': drift, 'n_avg': n_avg,
+                                          'Gamma': Gamma, 'tau': tau }
+    return results
+
+
+if __name__ == '__main__':
+    from Discretisation import plt
+
+    results = compare_precision( T, iter_max, tmax_dt, num_tests,
+                                tmax_frame, seed )
+
+    for name, result in results.items():
+        print( name + ' max |drift|: ' + str(np.max(np.abs(result['drift'])))
+              + ' <n>: ' + str(result['n_avg'])
+              + ' Gamma: ' + str(result['Gamma'])
+              + ' tau: ' + str(result['tau']) )
+
+    #   plot results
+    fig, ax = plt.subplots()
+    ax.set_xscale('log')
+    ax.set_xlabel('Timesteps')
+    ax.set_ylabel('Relative Energy Drift')
+    for name, result in results.items():
+        ax.plot(result['time_array_dt'], result['drift'], label=name)
+    ax.legend()
@@ -0,0 +1,273 @@
+"""
+Defines an on-disk cache of the results of test functions,
+such as those of Test_Functions, so that figures can be re-plotted
+and interrupted sweeps resumed without recomputing:
+
+code_version
+cache_key
+
+and the class:
+
+ResultCache
+
+A result is identified by a hash of the function, its arguments
+(the lattice expanded to N, L, lamb, dx, dt, frame_space and dtype),
+the kink thresholds h_kink and w_kink, the seed of its random stream,
+the stepping backend chosen by 'backend_name', whose rounding differs,
+and 'code_version', the hash of the simulation modules; so changing
+a plot script keeps the results, changing the physics discards them.
+
+The cache is a directory holding an SQLite index 'index.sqlite'
+of every result, its size and when it was last used, and one .npy blob
+per returned value; beyond 'max_bytes' the least recently used results
+are evicted.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from Discretisation import np, default_lattice, Lattice
+from Backends import backend_name
+from Kinks_and_Creations import h_kink, w_kink
+
+
+# modules whose source determines the results of the tests,
+# including 'Sweeps', which seeds each task
+CODE_MODULES = ( 'Discretisation', 'Initial_Conditions', 'Kinks_and_Creations',
+                 'Backends', 'Error_Analysis', 'Test_Functions',
+                 'Measurements', 'Sweeps' )
+
+# arguments which do not change the result
+IGNORED_ARGUMENTS = ( 'checkpoint', 'checkpoint_frames', 'checkpoint_seconds' )
+
+_missing = object()
+
+# kinds of result
+_VALUE, _TUPLE, _DICT = 0, 1, 2
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(modules=CODE_MODULES):
+    """
+    Hash of the source files of 'modules', importing them if need be
+    """
+    digest = hashlib.sha256()
+    for name in modules:
+        __import__(name)
+        with open(sys.modules[name].__file__, 'rb') as file:
+            # line endings do not change the code
+            digest.update( file.read().replace(b'\r\n', b'\n') )
+    return digest.hexdigest()
+
+
+def _canonical(value):
+    """
+    'value' as plain JSON types, a 'Lattice' as its parameters
+    """
+    if isinstance(value, Lattice):
+        return { 'N': value.N, 'L': value.L, 'lamb': value.lamb,
+                 'dx': value.dx, 'dt': value.dt,
+                 'frame_space': value.frame_space,
+                 'dtype': np.dtype(value.dtype).name }
+    if isinstance(value, np.random.SeedSequence):
+        return { 'entropy': value.entropy,
+                 'spawn_key': list(value.spawn_key) }
+    if isinstance(value, (np.ndarray, np.generic)):
+        return _canonical( value.tolist() )
+    if isinstance(value, (list, tuple)):
+        return [ _canonical(v) for v in value ]
+    if isinstance(value, dict):
+        return { str(k): _canonical(v) for k, v in value.items() }
+    return value
+
+
+def cache_key(function, args=(), kwargs=None, seed=None):
+    """
+    Key of the result of function(*args, **kwargs) seeded by 'seed',
+    an integer or np.random.SeedSequence, with defaults filled in
+    so that equal calls have equal keys
+
+    Returns
+    -------
+    key :    hexadecimal hash
+    params : JSON of everything hashed
+    """
+    bound = inspect.signature(function).bind( *args, **(kwargs or {}) )
+    bound.apply_defaults()
+    arguments = { name: value for name, value in bound.arguments.items()
+                  if name not in IGNORED_ARGUMENTS }
+    lattice = next( (value for value in arguments.values()
+                     if isinstance(value, Lattice)), default_lattice )
+
+    params = json.dumps( _canonical({
+                'function': function.__module__ + '.' + function.__qualname__,
+                'arguments': arguments,
+                'h_kink': h_kink, 'w_kink': w_kink,
+                'seed': seed,
+                'backend': backend_name(lattice=lattice),
+                'code_version': code_version() }), sort_keys=True )
+    return hashlib.sha256( params.encode() ).hexdigest(), params
+
+
+class ResultCache:
+    """
+    Cache of results in the directory 'path', by default that of the
+    environment variable RESULT_CACHE or ~/.result_cache,
+    holding at most 'max_bytes' of blobs
+
+    A result is a value, a tuple of values or a dictionary of named values,
+    each stored as an array and returned as a Python scalar if it has
+    no dimensions.
+    """
+    def __init__(self, path=None, max_bytes=2**30):
+        if path is None:
+            path = os.environ.get( 'RESULT_CACHE', os.path.join(
+                                   os.path.expanduser('~'), '.result_cache') )
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(path, 'blobs'), exist_ok=True)
+
+        self._index = sqlite3.connect( os.path.join(path, 'index.sqlite') )
+        with self._index:
+            self._index.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                ' key TEXT PRIMARY KEY, params TEXT, values_count INTEGER,'
+                ' kind INTEGER, bytes INTEGER, last_used REAL)' )
+
+    def _blob(self, key, i):
+        return os.path.join(self.path, 'blobs', key + '_' + str(i) + '.npy')
+
+    def __contains__(self, key):
+        return self._index.execute( 'SELECT 1 FROM results WHERE key = ?',
+                                    (key,) ).fetchone() is not None
+
+    def get(self, key, default=None):
+        """
+        The result stored under 'key', else 'default'
+        """
+        row = self._index.execute(
+                'SELECT values_count, kind FROM results WHERE key = ?',
+                (key,) ).fetchone()
+        if row is None:
+            return default
+        values_count, kind = row
+
+        try:
+            values = [ np.load(self._blob(key, i), allow_pickle=False)
+                       for i in range(values_count) ]
+        except FileNotFoundError:
+            # a blob removed by hand, the result is lost
+            self.remove(key)
+            return default
+        values = [ v.item() if v.ndim == 0 else v for v in values ]
+
+        with self._index:
+            self._index.execute( 'UPDATE results SET last_used = ? '
+                                 'WHERE key = ?', (time.time(), key) )
+        if kind == _DICT:
+            return dict( zip(values[0].tolist(), values[1:]) )
+        return tuple(values) if kind == _TUPLE else values[0]
+
+    def put(self, key, result, params=''):
+        """
+        Stores 'result' under 'key', with the JSON 'params' it was hashed
+        from, then evicts least recently used results beyond 'max_bytes'
+        """
+        if isinstance(result, dict):
+            # the names first, then the values
+            kind = _DICT
+            values = ( np.array(list(result), dtype=str), ) + \
+                     tuple( result.values() )
+        elif isinstance(result, tuple):
+            kind = _TUPLE
+            values = result
+        else:
+            kind = _VALUE
+            values = (result,)
+
+        # blobs first, so the index never points at a missing blob
+        size = 0
+        for i, value in enumerate(values):
+            name = self._blob(key, i)
+            with open(name + '.tmp', 'wb') as file:
+                np.save(file, np.asarray(value), allow_pickle=False)
+            os.replace(name + '.tmp', name)
+            size += os.path.getsize(name)
+
+        with self._index:
+            self._index.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                (key, params, len(values), kind, size, time.time()) )
+        self.evict()
+
+    def remove(self, key):
+        """
+        Removes the result stored under 'key' and its blobs
+        """
+        row = self._index.execute( 'SELECT values_count FROM results '
+                                   'WHERE key = ?', (key,) ).fetchone()
+        with self._index:
+            self._index.execute( 'DELETE FROM results WHERE key = ?', (key,) )
+        for i in range( row[0] if row else 0 ):
+            try:
+                os.remove( self._blob(key, i) )
+            except FileNotFoundError:
+                pass
+
+    def size(self):
+        """
+        Total size of the blobs (bytes)
+        """
+        return self._index.execute( 'SELECT COALESCE(SUM(bytes), 0) '
+                                    'FROM results' ).fetchone()[0]
+
+    def evict(self):
+        """
+        Removes the least recently used results until the blobs
+        take at most 'max_bytes'
+        """
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+        for key, size in self._index.execute(
+                'SELECT key, bytes FROM results ORDER BY last_used' ).fetchall():
+            self.remove(key)
+            excess -= size
+            if excess <= 0:
+                break
+
+    def call(self, function, *args, seed=None, **kwargs):
+        """
+        function(*args, **kwargs) with the global random state seeded by
+        'seed', from the cache if there, otherwise computed and stored;
+        without a 'seed' the state is seeded from the OS and the result,
+        not reproducible, is computed but never stored
+        """
+        key, params = cache_key(function, args, kwargs, seed)
+        result = self.get(key, _missing)
+        if result is _missing:
+            if isinstance(seed, np.random.SeedSequence):
+                np.random.seed( seed.generate_state(4) )
+            else:
+                np.random.seed( seed )
+            result = function(*args, **kwargs)
+            if seed is not None:
+                self.put(key, result, params)
+        return result
+
+    def close(self):
+        """
+        Closes the index
+        """
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
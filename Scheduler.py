@@ -0,0 +1,100 @@
+"""
+Defines functions to evolve a field and measure it at chosen times only:
+
+log_times
+observe
+
+and the class:
+
+Progress
+
+Between measurement times the field is advanced in as few calls of
+'fused_steps' as possible, and progress is printed at a fixed wall-clock
+rate rather than once per timestep.
+"""
+import time
+
+from Discretisation import np, default_lattice, fused_steps
+
+
+def log_times(t_min, t_max, num):
+    """
+    'num' logarithmically spaced times from 't_min' to 't_max' (timesteps),
+    as measured by the long-term energy conservation of Figures 2 and 3
+    """
+    return 10**np.linspace( np.log10(t_min), np.log10(t_max), num )
+
+
+class Progress:
+    """
+    Progress bar of 'total' units of work,
+    printing at most once every 'seconds' of wall-clock time
+    """
+    def __init__(self, total, seconds=1.0):
+        self.total = total
+        self.seconds = seconds
+        self._last = -np.inf
+
+    def update(self, done, force=False):
+        """
+        Prints 'done' out of 'total' if 'seconds' have passed since
+        the last print, or if 'force'
+        """
+        now = time.monotonic()
+        if force or now - self._last >= self.seconds:
+            self._last = now
+            print( str(done) +' out of ' + str(self.total),
+                  str(100*done/self.total)+'%')
+
+
+def observe(f_old, f, times, observers, start=0, chunk=10**4,
+            progress_seconds=1.0, lattice=default_lattice):
+    """
+    Given the previous and current field configurations, 'f_old' and 'f',
+    at time 'start', evolves them through every time in 'times' (timesteps)
+    using 'fused_steps', at most 'chunk' timesteps per call,
+    and at each calls every observer of the dictionary 'observers'
+    as observer(f_old, f)
+
+    As for a loop of 'next_timestep' while the time is below the next
+    measurement time, the field is measured at the first whole timestep
+    at or after each time; 'times' must be in increasing order
+
+    Progress is printed at most once every 'progress_seconds',
+    never if None
+
+    Returns
+    -------
+    f_old :   previous field configuration at the last time
+    f :       current field configuration at the last time
+    results : dictionary of the arrays of values returned by each observer,
+              one entry per time
+    """
+    results = { name: [] for name in observers }
+    progress = None
+    if progress_seconds is not None and len(times) > 0:
+        progress = Progress( int(np.ceil(times[-1])), progress_seconds )
+    counter = start
+
+    # For each specified time
+    for time_dt in times:
+
+        # evolve to next time, in chunks
+        while counter < time_dt:
+            steps = min( int(np.ceil(time_dt)) - counter, chunk )
+            f_old, f = fused_steps(f_old, f, steps, lattice)
+            counter += steps
+
+            # progress bar
+            if progress is not None:
+                progress.update( counter )
+
+        # At time, measure and store
+        for name, observer in observers.items():
+            results[name].append( observer(f_old, f) )
+
+    if progress is not None:
+        progress.update( counter, force=True )
+
+    return f_old, f, { name: np.array(values)
+                       for name, values in results.items() }
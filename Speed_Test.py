@@ -1,15 +1,55 @@
 """
-Produces Data for Table in section 2.1
+Benchmark suite, produces Data for Table in section 2.1
 
-Comparison of Speeds of 3 implementations of the finite difference method.
+Measures the updates per second of every implementation of
+the finite difference method, including every installed backend of
+'Backends', across lattice sizes, and the per-call cost
+of heat_bath_iteration, pairs, zeros_and_wide_gaps, smooth and energy
+across lattice sizes and temperatures; each with warm-up and repeats.
+Results are written as JSON and compared against a stored baseline,
+flagging regressions.
+
+Defines functions:
+
+Explicit_Loop
+matrix_operator
+Matrix
+best_time
+lattice_of_size
+thermal_field
+benchmark_stepping
+benchmark_functions
+run_benchmarks
+compare
+
+Run as a script:
+
+python Speed_Test.py [--sizes 512 4096] [--temperatures 0.5 1.0 10.0]
+                     [--output results.json] [--baseline baseline.json]
+                     [--save-baseline] [--tolerance 0.2]
 """
-from Discretisation import np, C_1,C_2, C_3, N, next_timestep
-from Initial_Conditions import heat_bath
+import argparse
+import json
+import platform
+import sys
 import time
 
+from Discretisation import np, C_1,C_2, C_3, L, N, Lattice, \
+                            next_timestep, energy, Stepper, fused_steps, numba
+from Initial_Conditions import heat_bath, heat_bath_iteration, \
+                            heat_bath_iteration_vectorized
+from Kinks_and_Creations import pairs, pairs_loop, zeros_and_wide_gaps, \
+                            smooth, smooth_loop, buff_frame
+from Backends import backends
+
 
-T = 1.0
-tmax = 10**5
+sizes = [N, 8 * N]                  # lattice sizes (nodes)
+temperatures = [0.5, 1.0, 10.0]     # temperatures of the fields measured
+tmax_frame = 10**4                  # frames in the series smoothed
+matrix_max = 4096                   # largest lattice for the Matrix Method
+loop_max = N                        # largest lattice for explicit loops
+sigma_factor = 0.05                 # standard deviation factor
+baseline = 'benchmark_baseline.json'
 
 
 def Explicit_Loop( f_old , f ):
@@ -17,76 +57,266 @@ def Explicit_Loop( f_old , f ):
     Given the previous and current field configurations, 'f_old' and 'f',
     updates the field configurations to the next timestep
     according to equation (13)
-    
+
     In particular uses the Explicit Loop
-    
+
     Returns
     -------
     f :     current field configuration
-    f_new : next field configuration 
+    f_new : next field configuration
     """
     f_new = - f_old + C_3 * f ** 3
-    for i in range ( N ) :
+    for i in range ( len(f) ) :
         f_new [ i - 1 ] += C_1 * f [ i - 1 ] + C_2 * ( f [ i - 2 ] + f [ i ] )
     return f , f_new
 
 
-M = np . zeros ( N * N ) . reshape (( N , N ) )
-for i in range( N ):
-    M [i , i - 1 ] = C_2
-    M [i , i ] = C_1
-    M [ i -1 , i ] = C_2
-    
-def Matrix( f_old , f ):
+def matrix_operator( n ):
+    """
+    Builds the dense n x n matrix 'M' of the Matrix Method equation (14)
+    """
+    M = np . zeros ( n * n ) . reshape (( n , n ) )
+    for i in range( n ):
+        M [i , i - 1 ] = C_2
+        M [i , i ] = C_1
+        M [ i -1 , i ] = C_2
+    return M
+
+
+def Matrix( f_old , f, M ):
     """
     Given the previous and current field configurations, 'f_old' and 'f',
     updates the field configurations to the next timestep
     according to equation (13)
-    
+
     In particular uses the Matrix Method equation (14)
-    
+    with the matrix 'M' of 'matrix_operator'
+
     Returns
     -------
     f :     current field configuration
-    f_new : next field configuration 
+    f_new : next field configuration
     """
     return f , - f_old + np . matmul (M , f ) + C_3 * f * f * f
 
 
-# test of explicit loop
-f_old, f = heat_bath(T)
-t0 = time.time()
-for _ in range(tmax):
-    f_old, f = Explicit_Loop( f_old , f )
-t1 = time.time()
-t = t1-t0
+def best_time( function, number, repeats=5, warmup=1 ):
+    """
+    Calls 'function' 'warmup' times, then 'repeats' times 'number' calls
 
-print('Explicit Loop ' + 
-      'Time Taken: '+str(t) + 
-      ' Updates per second: '+ str(tmax/t) )
+    Returns
+    -------
+    seconds : best time per call over the repeats
+    """
+    for _ in range( warmup ):
+        function()
+
+    best = np.inf
+    for _ in range( repeats ):
+        t0 = time.perf_counter()
+        for _ in range( number ):
+            function()
+        t1 = time.perf_counter()
+        best = min( best, (t1 - t0) / number )
+    return best
+
+
+def lattice_of_size( n ):
+    """
+    The 'Lattice' of 'n' nodes with the default node spacing, 
+    so the coefficients C_1, C_2, C_3 are unchanged
+    """
+    return Lattice( L * n / N, n )
+
+
+def thermal_field( T, lattice ):
+    """
+    Prepares a thermalised state of temperature 'T' on the 'lattice'
+    using 'heat_bath'
+    """
+    return heat_bath(T, vectorized=True, lattice=lattice)
+
+
+def benchmark_stepping( sizes, steps=1000, repeats=5 ):
+    """
+    Measures the updates per second of each stepping implementation,
+    for each lattice size in 'sizes'
+
+    Returns
+    -------
+    results : dictionary of seconds per timestep, keyed by name
+    """
+    results = {}
+    for n in sizes:
+        lattice = lattice_of_size( n )
+        f_old, f = thermal_field(1.0, lattice)
+
+        def run( step ):
+            def timesteps():
+                g_old, g = f_old, f
+                for _ in range( steps ):
+                    g_old, g = step( g_old, g )
+            return timesteps
+
+        if n <= loop_max:
+            results['step/Explicit Loop/N=' + str(n)] = \
+                best_time( run(Explicit_Loop), 1, repeats ) / steps
+        if n <= matrix_max:
+            M = matrix_operator( n )
+            results['step/Matrix/N=' + str(n)] = \
+                best_time( run(lambda g_old, g: Matrix(g_old, g, M)),
+                          1, repeats ) / steps
+
+        results['step/Rolling Array/N=' + str(n)] = \
+            best_time( run(lambda g_old, g: next_timestep(g_old, g, lattice)),
+                      1, repeats ) / steps
+
+        stepper = Stepper(f_old, f, lattice)
+        def in_place():
+            for _ in range( steps ):
+                stepper.next_timestep()
+        results['step/In-Place/N=' + str(n)] = \
+            best_time( in_place, 1, repeats ) / steps
+
+        name = 'Fused' if numba is not None else 'Fused (no Numba)'
+        results['step/' + name + '/N=' + str(n)] = \
+            best_time( lambda: fused_steps(f_old, f, steps, lattice), 
+                      1, repeats ) / steps
+
+        for name, backend in backends.items():
+            results['step/Backend ' + name + '/N=' + str(n)] = \
+                best_time( lambda: backend(f_old, f, steps, lattice),
+                          1, repeats ) / steps
+
+    return results
+
+
+def benchmark_functions( sizes, temperatures, repeats=5 ):
+    """
+    Measures the per-call cost of the functions applied once per frame
+    or per heat bath iteration, at each temperature in 'temperatures',
+    for each lattice size in 'sizes'
+
+    Returns
+    -------
+    results : dictionary of seconds per call, keyed by name
+    """
+    results = {}
+    for T in temperatures:
+        sigma = sigma_factor * np.sqrt(T)
+        for n in sizes:
+            lattice = lattice_of_size( n )
+            f_old, f = thermal_field(T, lattice)
+            key = '/T=' + str(T) + '/N=' + str(n)
+
+            results['energy' + key] = \
+                best_time( lambda: energy(f_old, f, lattice), 100, repeats )
+            results['pairs' + key] = \
+                best_time( lambda: pairs(f), 100, repeats )
+            results['pairs_loop' + key] = \
+                best_time( lambda: pairs_loop(f), 10, repeats )
+            results['zeros_and_wide_gaps' + key] = \
+                best_time( lambda: zeros_and_wide_gaps(f), 100, repeats )
+            g = f.copy()
+            results['heat_bath_iteration' + key] = \
+                best_time( lambda: heat_bath_iteration(f_old, g, T, sigma,
+                          lattice), 1, repeats )
+            results['heat_bath_iteration_vectorized' + key] = \
+                best_time( lambda: heat_bath_iteration_vectorized(
+                          f_old, g, T, sigma, lattice), 10, repeats )
+
+    # a series of pair numbers, changing every few frames
+    rng = np.random.default_rng(0)
+    series = np.repeat( rng.integers(0, 4, tmax_frame + buff_frame),
+                       rng.integers(1, 8, tmax_frame + buff_frame) )
+    series = series[: tmax_frame + buff_frame].astype(float)
+    key = '/frames=' + str(tmax_frame)
+    results['smooth' + key] = \
+        best_time( lambda: smooth(series, tmax_frame), 10, repeats )
+    results['smooth_loop' + key] = \
+        best_time( lambda: smooth_loop(series.copy(), tmax_frame),
+                  1, repeats )
+
+    return results
+
+
+def run_benchmarks( sizes=sizes, temperatures=temperatures, repeats=5 ):
+    """
+    Runs 'benchmark_stepping' and 'benchmark_functions'
+
+    Returns
+    -------
+    report : dictionary of the machine details and the timings,
+             seconds per call keyed by name
+    """
+    np.random.seed(0)
+    timings = benchmark_stepping( sizes, repeats=repeats )
+    timings.update( benchmark_functions( sizes, temperatures, repeats ) )
+
+    machine = { 'python': platform.python_version(),
+                'numpy': np.__version__,
+                'numba': getattr(numba, '__version__', None),
+                'platform': platform.platform(),
+                'date': time.strftime('%Y-%m-%d %H:%M:%S') }
+    return { 'machine': machine, 'seconds': timings }
+
+
+def compare( report, reference, tolerance=0.2 ):
+    """
+    Compares the timings of 'report' with those of 'reference';
+    a timing more than a fraction 'tolerance' slower is a regression
+
+    Returns
+    -------
+    regressions : list of the names of regressed timings
+    """
+    regressions = []
+    for name, seconds in report['seconds'].items():
+        if name not in reference['seconds']:
+            continue
+        ratio = seconds / reference['seconds'][name]
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append( name )
+            flag = '  REGRESSION'
+        print( name + ': ' + str(round(ratio, 3)) + ' x baseline' + flag )
+    return regressions
 
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser( description=__doc__.split('\n')[1] )
+    parser.add_argument( '--sizes', type=int, nargs='+', default=sizes )
+    parser.add_argument( '--temperatures', type=float, nargs='+',
+                        default=temperatures )
+    parser.add_argument( '--repeats', type=int, default=5 )
+    parser.add_argument( '--output', help='JSON file for the results' )
+    parser.add_argument( '--baseline', default=baseline )
+    parser.add_argument( '--save-baseline', action='store_true' )
+    parser.add_argument( '--tolerance', type=float, default=0.2 )
+    args = parser.parse_args()
 
-# test of Matrix Method
-f_old, f = heat_bath(T)
-t0 = time.time()
-for _ in range(tmax):
-    f_old, f = Matrix( f_old , f )  
-t1 = time.time()
-t = t1-t0
-print('Matrix ' + 
-      'Time Taken: '+str(t) + 
-      ' Updates per second: '+ str(tmax/t) )
+    report = run_benchmarks( args.sizes, args.temperatures, args.repeats )
 
+    # Table of section 2.1
+    for name, seconds in report['seconds'].items():
+        if name.startswith('step/'):
+            print( name[5:] + ' Updates per second: ' + str(1 / seconds) )
+        else:
+            print( name + ' Time per call: ' + str(seconds) )
 
-# test of Rolling Array
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump( report, file, indent=2 )
 
-f_old, f = heat_bath(T)
-t0 = time.time()
-for _ in range(tmax):
-    f_old, f = next_timestep( f_old , f )  
-t1 = time.time()
-t = t1-t0
-print('Rolling Array ' + 
-      'Time Taken: '+str(t) + 
-      ' Updates per second: '+ str(tmax/t) )
\ No newline at end of file
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump( report, file, indent=2 )
+    else:
+        try:
+            with open(args.baseline) as file:
+                reference = json.load( file )
+        except FileNotFoundError:
+            print( 'No baseline ' + args.baseline + ' to compare against' )
+        else:
+            if compare( report, reference, args.tolerance ):
+                sys.exit(1)
@@ -0,0 +1,95 @@
+"""
+Defines functions to run a test function over a sweep of parameter points
+in parallel, one worker process per core:
+
+sweep
+
+Every task is seeded from its own child of a single np.random.SeedSequence,
+so results are reproducible whatever the number of workers,
+and may be kept in a 'ResultCache' so that only missing points are computed.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import time
+
+from Discretisation import np
+from Result_Cache import cache_key
+
+
+def _run_task(test_function, point, seed_sequence):
+    """
+    Seeds the global random state of this worker from 'seed_sequence',
+    then calls 'test_function' with the arguments 'point'
+    
+    Returns
+    -------
+    result :    return value of 'test_function'
+    wall_time : time taken by the call (seconds)
+    """
+    np.random.seed( seed_sequence.generate_state(4) )
+    
+    t0 = time.perf_counter()
+    result = test_function( *point )
+    t1 = time.perf_counter()
+    return result, t1 - t0
+
+
+def sweep(test_function, points, seed=None, max_workers=None, progress=True,
+          cache=None):
+    """
+    Calls 'test_function' once for every parameter point in 'points',
+    a list of tuples of positional arguments,
+    farming the calls out to a pool of 'max_workers' processes
+    
+    Each call gets its own child of np.random.SeedSequence('seed')
+    
+    'test_function' must be importable by the worker processes,
+    e.g. a function of Test_Functions;
+    scripts calling 'sweep' should do so under 'if __name__ == "__main__"'
+    
+    If given a 'ResultCache' 'cache', points already in it are read
+    rather than computed, with wall time 0, and every new result is stored
+    as soon as it finishes; 'seed' should then be fixed, as the key
+    includes each call's seed
+    
+    Returns
+    -------
+    results :    list of return values of 'test_function', in order of 'points'
+    wall_times : array of time taken by each call (seconds)
+    """
+    points = [ point if isinstance(point, tuple) else (point,) 
+              for point in points ]
+    seed_sequences = np.random.SeedSequence( seed ).spawn( len(points) )
+    
+    results = [None] * len(points)
+    wall_times = np.zeros( len(points) )
+    
+    # read cached points, leaving the rest to compute
+    missing = list( range(len(points)) )
+    if cache is not None:
+        keys = [ cache_key(test_function, point, seed=s) 
+                for point, s in zip(points, seed_sequences) ]
+        results = [ cache.get(key) for key, params in keys ]
+        missing = [ i for i, result in enumerate(results) if result is None ]
+        if progress:
+            print(str(len(points) - len(missing)) + ' out of ' 
+                  + str(len(points)) + ' cached')
+    
+    if not missing:
+        return results, wall_times
+    
+    with ProcessPoolExecutor( max_workers ) as executor:
+        futures = { executor.submit(_run_task, test_function, points[i], 
+                                    seed_sequences[i]): i for i in missing }
+        
+        # collect results as they finish, stored in order of 'points'
+        for done, future in enumerate( as_completed(futures) ):
+            i = futures[future]
+            results[i], wall_times[i] = future.result()
+            if cache is not None:
+                cache.put( keys[i][0], results[i], keys[i][1] )
+            
+            # progress bar
+            if progress:
+                print(str(done+1) + ' out of ' + str(len(missing)))
+            
+    return results, wall_times
@@ -5,20 +5,42 @@ heat_bath_T_test
 zeros_and_wide_gaps_test
 pairs_test
 Gamma_and_tau_test
+resume_Gamma_and_tau_test
+save_checkpoint
+load_checkpoint
+
+and adaptive variants, which run until a requested relative error,
+or for averages near 0 an absolute error, is reached
+rather than for a fixed number of frames:
+
+zeros_and_wide_gaps_test_adaptive
+pairs_test_adaptive
+Gamma_and_tau_test_adaptive
+
+Every test takes the lattice parameters as a 'Lattice', 
+by default 'default_lattice', 
+and evolves frames with the stepping backend chosen by 'Backends'
 """
-from Discretisation import np, plt, N, next_timestep, next_frame, energy
+import os
+import pickle
+import time
+
+from Discretisation import np, plt, default_lattice, next_timestep_energy, \
+                            energy
+from Backends import next_frame
 from Initial_Conditions import heat_bath
 from Kinks_and_Creations import zeros_and_wide_gaps, pairs, \
-                            creation_rates, buff_frame
+                            CreationCounter, kink_frames
+from Error_Analysis import OnlineBlocking
 
-def heat_bath_T_test(T, iter_max, sigma_factor):
+def heat_bath_T_test(T, iter_max, sigma_factor, lattice=default_lattice):
     """
     Prepares initial condition of temperature 'T'
     according to the Metropolis-Hastings Algorithm
     using 'heat_bath'
     Tracks Energy Distribution over the next 'iter_max' timesteps,
     returns averages
-    using 'energy'
+    using 'next_timestep_energy'
     
     Returns
     -------
@@ -29,7 +51,7 @@ def heat_bath_T_test(T, iter_max, sigma_factor):
     alpha :   energy-temperature proportionality constant
     """
     # initialise state heat bath algorithm
-    f_old, f = heat_bath(T, sigma_factor=sigma_factor)
+    f_old, f = heat_bath(T, sigma_factor=sigma_factor, lattice=lattice)
     
     # Initialize arrays 
     Kf_array = np.zeros( iter_max )
@@ -43,15 +65,13 @@ def heat_bath_T_test(T, iter_max, sigma_factor):
     for iter_num in range(iter_max):
         
         # Once per iteration, measure energies and store
-        K, I, P, E = energy(f_old, f)
+        # Evolve by one time-step
+        f_old, f, (K, I, P, E) = next_timestep_energy(f_old, f, lattice)
         Kf_array[iter_num] = K/E
         If_array[iter_num] = I/E
         Pf_array[iter_num] = P/E
         E_array[iter_num] = E
         
-        # Evolve by one time-step
-        f_old, f = next_timestep(f_old, f)
-        
         
     #   calculate means since disconnection from heat bath
     Kf_avg = np.mean((Kf_array))
@@ -60,12 +80,13 @@ def heat_bath_T_test(T, iter_max, sigma_factor):
     E_avg = np.mean(E_array)
     
     #   calculate the constant of proportionality
-    alpha = E_avg / (N*T)
+    alpha = E_avg / (lattice.N*T)
     
     return Kf_avg, If_avg, Pf_avg, E_avg, alpha
 
 
-def zeros_and_wide_gaps_test( T, e_tests, tmax_frame):
+def zeros_and_wide_gaps_test( T, e_tests, tmax_frame, 
+                             lattice=default_lattice, return_series=False ):
     """
     Average zeros and wide gaps at temperature
     
@@ -85,30 +106,40 @@ def zeros_and_wide_gaps_test( T, e_tests, tmax_frame):
     E_avg :   average total energy
     z_avg :   average number of zero-crossings
     g_avg :   average number of wide gaps
+    
+    and if 'return_series', the per-frame series
+    
+    z_array : number of zero-crossings of each frame
+    g_array : number of wide gaps of each frame
     """
     
     # intial conditions of this temperature
-    f_old, f = heat_bath(T)
+    f_old, f = heat_bath(T, lattice=lattice)
     
     # reset counters
     z = 0
     g = 0
     E = 0
+    if return_series:
+        z_array = np.zeros( tmax_frame, dtype=int )
+        g_array = np.zeros( tmax_frame, dtype=int )
     
     # for each frame until tmax
     for j in range( tmax_frame ):
             
         # evolve to next frame
-        f_old, f = next_frame(f_old, f)
+        f_old, f = next_frame(f_old, f, lattice)
                 
         # on frame, count zeros and wide gaps 
         z_new, g_new = zeros_and_wide_gaps( f )
         z += z_new
         g += g_new
+        if return_series:
+            z_array[j], g_array[j] = z_new, g_new
             
         # rarely evaluate energy
         if j % (tmax_frame // e_tests) == 0:
-            E += energy(f_old, f)[-1]
+            E += energy(f_old, f, lattice)[-1]
             
     # calculate average energy over all measurements
     E_avg = E / e_tests
@@ -117,10 +148,13 @@ def zeros_and_wide_gaps_test( T, e_tests, tmax_frame):
     z_avg = z / tmax_frame
     g_avg = g / tmax_frame
     
+    if return_series:
+        return E_avg, z_avg, g_avg, z_array, g_array
     return E_avg, z_avg, g_avg
 
 
-def pairs_test( T, e_tests, tmax_frame):
+def pairs_test( T, e_tests, tmax_frame, lattice=default_lattice, 
+                return_series=False ):
     """
     Average pair number 'n' at temperature
     
@@ -138,27 +172,35 @@ def pairs_test( T, e_tests, tmax_frame):
     -------
     E_avg :   average total energy
     n_avg :   average number of pairs
+    
+    and if 'return_series', the per-frame series
+    
+    n_array : number of pairs of each frame
     """
     # intial conditions of this temperature
-    f_old, f = heat_bath(T)
+    f_old, f = heat_bath(T, lattice=lattice)
     
     # reset counters
     n = 0
     E = 0
+    if return_series:
+        n_array = np.zeros( tmax_frame, dtype=int )
     
     # for each frame until tmax
     for j in range( tmax_frame ):
             
         # evolve to next frame
-        f_old, f = next_frame(f_old, f)
+        f_old, f = next_frame(f_old, f, lattice)
                 
         # on frame, count pairs 
-        n += pairs( f )
-
+        n_new = pairs( f )
+        n += n_new
+        if return_series:
+            n_array[j] = n_new
             
         # rarely evaluate energy
         if j % (tmax_frame // e_tests) == 0:
-            E += energy(f_old, f)[-1]
+            E += energy(f_old, f, lattice)[-1]
             
     # calculate average energy over all measurements
     E_avg = E / e_tests
@@ -166,9 +208,42 @@ def pairs_test( T, e_tests, tmax_frame):
     # calculate mean pair number over all frames
     n_avg = n / tmax_frame
     
+    if return_series:
+        return E_avg, n_avg, n_array
     return E_avg, n_avg
 
-def Gamma_and_tau_test( T, e_tests = 1000, tmax_frame=10**5 ):
+def save_checkpoint(path, state):
+    """
+    Atomically writes the run 'state', a dictionary, 
+    together with the global NumPy random state to the file 'path'
+    
+    Writes to a temporary file first and then replaces 'path', 
+    so an interruption never leaves a partially written checkpoint
+    """
+    state = dict(state, random_state=np.random.get_state())
+    
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path):
+    """
+    Reads a run state written by 'save_checkpoint' from the file 'path'
+    and restores the global NumPy random state
+    """
+    with open(path, 'rb') as file:
+        state = pickle.load(file)
+    np.random.set_state(state.pop('random_state'))
+    return state
+
+
+def Gamma_and_tau_test( T, e_tests = 1000, tmax_frame=10**5, 
+                       lattice=default_lattice, checkpoint=None,
+                       checkpoint_frames=None, checkpoint_seconds=None ):
     """
     Creation rate, creation time over 'tmax_frame' at temperature 'T'
     
@@ -179,11 +254,17 @@ def Gamma_and_tau_test( T, e_tests = 1000, tmax_frame=10**5 ):
     using 'next_frame'
     Measures numbers of pairs every frame,
     using 'pairs'
-    Calculates creation rate 'gamma' and creation time 'tau',
-    using 'creation_rates'
+    Calculates creation rate 'gamma' and creation time 'tau' as it goes,
+    using 'CreationCounter'
     Measures total energy 'e_tests' times throughout,
     using 'energy'
     
+    If a 'checkpoint' file is given, the full run state is saved to it
+    every 'checkpoint_frames' frames and/or 'checkpoint_seconds' seconds 
+    (by default every 10**4 frames) and once the run is complete,
+    using 'save_checkpoint';
+    an interrupted run is continued with 'resume_Gamma_and_tau_test'
+    
     Returns
     -------
     E_avg :   average total energy
@@ -191,29 +272,242 @@ def Gamma_and_tau_test( T, e_tests = 1000, tmax_frame=10**5 ):
     tau   :   creation time
     """
     # initial conditions of this temperature
-    f_old, f = heat_bath(T)
+    f_old, f = heat_bath(T, lattice=lattice)
         
     # reset counters
-    k_array = np.zeros(tmax_frame + buff_frame)
-    E = 0
+    state = { 'T': T, 'e_tests': e_tests, 'tmax_frame': tmax_frame,
+              'lattice': lattice, 'frame': 0, 'f_old': f_old, 'f': f, 
+              'counter': CreationCounter(lattice), 'E': 0 }
+    
+    return _Gamma_and_tau_run( state, checkpoint, 
+                               checkpoint_frames, checkpoint_seconds )
+
+
+def resume_Gamma_and_tau_test( checkpoint, checkpoint_frames=None, 
+                               checkpoint_seconds=None ):
+    """
+    Continues a run of 'Gamma_and_tau_test' from its last 'checkpoint', 
+    using 'load_checkpoint', and keeps checkpointing to the same file
+    
+    The random state is restored too, so the result is bit-identical
+    to that of an uninterrupted run
+    
+    Returns
+    -------
+    E_avg :   average total energy
+    Gamma :   creation rate
+    tau   :   creation time
+    """
+    state = load_checkpoint( checkpoint )
+    return _Gamma_and_tau_run( state, checkpoint, 
+                               checkpoint_frames, checkpoint_seconds )
+
+
+def _Gamma_and_tau_run( state, checkpoint, checkpoint_frames, 
+                        checkpoint_seconds ):
+    """
+    Evolves the run 'state' of 'Gamma_and_tau_test' to completion,
+    saving it to 'checkpoint' as it goes
+    """
+    e_tests = state['e_tests']
+    tmax_frame = state['tmax_frame']
+    lattice = state['lattice']
+    buff_frame = kink_frames( lattice )[1]
+    f_old, f = state['f_old'], state['f']
+    counter = state['counter']
+    E = state['E']
+    
+    if checkpoint_frames is None and checkpoint_seconds is None:
+        checkpoint_frames = 10**4
+    last_save = time.time()
         
     # for each frame until tmax_frame
-    for j in range( tmax_frame + buff_frame ):
+    for j in range( state['frame'], tmax_frame + buff_frame ):
             
         # evolve to next frame
-        f_old, f = next_frame(f_old, f)
+        f_old, f = next_frame(f_old, f, lattice)
                 
         # on frame, count pairs 
-        k_array[j] = pairs(f)
+        counter.feed( pairs(f) )
             
         # rarely evaluate energy
         if j % (tmax_frame // e_tests) == 0:
-            E += energy(f_old, f)[-1]
+            E += energy(f_old, f, lattice)[-1]
+            
+        # periodically save the run state
+        if checkpoint is not None and (
+                (checkpoint_frames and (j + 1) % checkpoint_frames == 0) or
+                (checkpoint_seconds and 
+                 time.time() - last_save >= checkpoint_seconds)):
+            state.update( frame=j+1, f_old=f_old, f=f, E=E )
+            save_checkpoint( checkpoint, state )
+            last_save = time.time()
+    
+    # the complete run, so resuming it returns the result
+    if checkpoint is not None:
+        state.update( frame=tmax_frame + buff_frame, f_old=f_old, f=f, E=E )
+        save_checkpoint( checkpoint, state )
             
     # calculate average energy over all measurements
     E_avg = E / e_tests
     
     # calculate the pair creation time
-    Gamma, tau = creation_rates(k_array, tmax_frame)
+    Gamma, tau = counter.creation_rates()
 
     return E_avg, Gamma, tau
+
+
+def _adaptive_run( T, measure, blockings, rel_error, abs_error, min_frame,
+                   max_frame, e_space, check_frames, lattice ):
+    """
+    Prepares initial condition of temperature 'T'
+    using 'heat_bath'
+    Evolves it frame by frame, using 'next_frame',
+    feeding the values measure(f) of each frame to 'blockings',
+    a None value skipped, until after at least 'min_frame' frames
+    the error of every blocking is at most 'rel_error' of its mean
+    or 'abs_error', whichever is larger, checked every 'check_frames',
+    or until 'max_frame' frames
+    Measures total energy every 'e_space' frames,
+    using 'energy'
+    
+    Returns
+    -------
+    E_avg :   average total energy
+    frames :  number of frames evolved
+    """
+    f_old, f = heat_bath(T, lattice=lattice)
+    E = 0
+    e_tests = 0
+    
+    for frames in range( 1, max_frame + 1 ):
+        
+        # evolve to next frame
+        f_old, f = next_frame(f_old, f, lattice)
+        
+        # on frame, measure
+        for blocking, value in zip( blockings, measure(f) ):
+            if value is not None:
+                blocking.feed( value )
+        
+        # rarely evaluate energy
+        if frames % e_space == 1 or e_space == 1:
+            E += energy(f_old, f, lattice)[-1]
+            e_tests += 1
+        
+        # stop once precise enough, absolutely for averages near 0
+        if frames >= min_frame and frames % check_frames == 0 and all( 
+                b.error() <= max( rel_error * abs(b.mean()), abs_error )
+                for b in blockings ):
+            break
+    
+    return E / e_tests, frames
+
+
+def zeros_and_wide_gaps_test_adaptive( T, rel_error=0.01, abs_error=1e-3,
+                                       min_frame=10**3, max_frame=10**6,
+                                       e_space=100, check_frames=100,
+                                       lattice=default_lattice ):
+    """
+    Average zeros and wide gaps at temperature, as 'zeros_and_wide_gaps_test'
+    
+    Evolves until the averages of both reach the relative error 'rel_error'
+    or the absolute error 'abs_error',
+    after between 'min_frame' and 'max_frame' frames,
+    using 'OnlineBlocking'
+    
+    Returns
+    -------
+    E_avg :   average total energy
+    z_avg :   average number of zero-crossings
+    g_avg :   average number of wide gaps
+    z_err :   error of 'z_avg'
+    g_err :   error of 'g_avg'
+    ess :     effective sample size, the smaller of the two
+    frames :  number of frames evolved
+    """
+    z, g = OnlineBlocking(), OnlineBlocking()
+    E_avg, frames = _adaptive_run( T, zeros_and_wide_gaps, [z, g], 
+                                   rel_error, abs_error, min_frame, max_frame,
+                                   e_space, check_frames, lattice )
+    
+    ess = min( z.effective_samples(), g.effective_samples() )
+    return E_avg, z.mean(), g.mean(), z.error(), g.error(), ess, frames
+
+
+def pairs_test_adaptive( T, rel_error=0.01, abs_error=1e-3, min_frame=10**3,
+                         max_frame=10**6, e_space=100, check_frames=100,
+                         lattice=default_lattice ):
+    """
+    Average pair number 'n' at temperature, as 'pairs_test'
+    
+    Evolves until the average reaches the relative error 'rel_error'
+    or, e.g. without pairs at low temperature, the absolute error 'abs_error',
+    after between 'min_frame' and 'max_frame' frames,
+    using 'OnlineBlocking'
+    
+    Returns
+    -------
+    E_avg :   average total energy
+    n_avg :   average number of pairs
+    n_err :   error of 'n_avg'
+    ess :     effective sample size
+    frames :  number of frames evolved
+    """
+    n = OnlineBlocking()
+    E_avg, frames = _adaptive_run( T, lambda f: (pairs(f),), [n], 
+                                   rel_error, abs_error, min_frame, max_frame,
+                                   e_space, check_frames, lattice )
+    
+    return E_avg, n.mean(), n.error(), n.effective_samples(), frames
+
+
+def Gamma_and_tau_test_adaptive( T, rel_error=0.05, abs_error=1e-3,
+                                 min_frame=10**3, max_frame=10**6,
+                                 e_space=100, check_frames=100,
+                                 lattice=default_lattice ):
+    """
+    Creation rate, creation time at temperature 'T', 
+    as 'Gamma_and_tau_test'
+    
+    The number of creations in each final frame of 'CreationCounter'
+    is streamed to 'OnlineBlocking'; evolves until their average
+    reaches the relative error 'rel_error' or the absolute error 'abs_error'
+    (creations per frame), after between 'min_frame' and 'max_frame' frames
+    
+    Returns
+    -------
+    E_avg :     average total energy
+    Gamma :     creation rate
+    tau   :     creation time, infinite without creations
+    Gamma_err : error of 'Gamma'
+    tau_err :   error of 'tau'
+    ess :       effective sample size
+    frames :    number of frames evolved
+    """
+    counter = CreationCounter(lattice)
+    c = OnlineBlocking()
+    
+    def measure( f ):
+        # creations of the new final frame, if any
+        frames, creations = counter.frames, counter.creations
+        counter.feed( pairs(f) )
+        if counter.frames > frames:
+            return ( counter.creations - creations, )
+        return ( None, )
+    
+    E_avg, frames = _adaptive_run( T, measure, [c], rel_error, abs_error,
+                                   min_frame, max_frame, e_space,
+                                   check_frames, lattice )
+    
+    # proper time of one frame
+    frame_units = lattice.frame_space * lattice.dt
+    Gamma = c.mean() / frame_units
+    Gamma_err = c.error() / frame_units
+    tau, tau_err = np.inf, np.inf
+    if Gamma > 0:
+        tau = 1 / Gamma
+        tau_err = tau * Gamma_err / Gamma
+    
+    return E_avg, Gamma, tau, Gamma_err, tau_err, c.effective_samples(), \
+           frames
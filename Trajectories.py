@@ -0,0 +1,215 @@
+"""
+Defines classes to record field evolutions to disk and replay them:
+
+TrajectoryWriter
+Trajectory
+
+and functions:
+
+record_trajectory
+load_or_record
+
+A trajectory is a directory holding the frames of 'f', and optionally
+of 'f_old', as preallocated .npy files of shape (frames, N),
+opened with np.lib.format.open_memmap, and a small header 'header.json'
+of the temperature, seed, lattice and number of frames written.
+Frame 0 is the initial state, frame j the state after j frames.
+"""
+import json
+import os
+
+from Discretisation import np, default_lattice, Lattice, Stepper
+from Initial_Conditions import heat_bath
+
+
+def _write_header(path, header):
+    """
+    Writes the dictionary 'header' to 'header.json' in the trajectory 'path',
+    through a temporary file so an interrupted write leaves the old header
+    """
+    name = os.path.join(path, 'header.json')
+    with open(name + '.tmp', 'w') as file:
+        json.dump(header, file, indent=2)
+    os.replace(name + '.tmp', name)
+
+
+class TrajectoryWriter:
+    """
+    Streams frames into a trajectory at 'path'
+    of at most 'num_frames' frames on the 'lattice'
+
+    Frames are gathered in memory in chunks of 'chunk_frames'
+    and copied to the memory mapped files a chunk at a time;
+    the header is updated with the number of frames at each chunk,
+    so an interrupted recording can still be read up to its last chunk.
+
+    Use as a context manager, or call 'close' when done.
+    """
+    def __init__(self, path, num_frames, T=None, seed=None, keep_f_old=False,
+                 chunk_frames=1000, lattice=default_lattice):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.num_frames = num_frames
+        self.frames = 0
+        self.header = { 'T': T, 'seed': seed,
+                        'L': lattice.L, 'N': lattice.N, 'lamb': lattice.lamb,
+                        'frame_space': lattice.frame_space,
+                        'dtype': np.dtype(lattice.dtype).name,
+                        'keep_f_old': keep_f_old, 'frames': 0 }
+
+        names = ['f', 'f_old'] if keep_f_old else ['f']
+        self._files = [ np.lib.format.open_memmap(
+                            os.path.join(path, name + '.npy'), mode='w+',
+                            dtype=lattice.dtype,
+                            shape=(num_frames, lattice.N) )
+                        for name in names ]
+        self._chunks = [ np.empty((chunk_frames, lattice.N), lattice.dtype)
+                         for name in names ]
+        self._filled = 0
+        _write_header(path, self.header)
+
+    def append(self, f_old, f):
+        """
+        Records the field configurations 'f_old' and 'f' as the next frame
+        """
+        if self.frames + self._filled >= self.num_frames:
+            raise ValueError('trajectory is full at ' + str(self.num_frames)
+                             + ' frames')
+        for chunk, field in zip(self._chunks, (f, f_old)):
+            chunk[self._filled] = field
+        self._filled += 1
+
+        if self._filled == len(self._chunks[0]):
+            self.flush()
+
+    def flush(self):
+        """
+        Copies the gathered frames to disk and updates the header
+        """
+        if self._filled == 0:
+            return
+        for file, chunk in zip(self._files, self._chunks):
+            file[self.frames : self.frames + self._filled] = \
+                chunk[:self._filled]
+            file.flush()
+        self.frames += self._filled
+        self._filled = 0
+
+        self.header['frames'] = self.frames
+        _write_header(self.path, self.header)
+
+    def close(self):
+        """
+        Flushes any gathered frames and releases the files
+        """
+        self.flush()
+        self._files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Trajectory:
+    """
+    Read-only access to the trajectory at 'path'
+
+    Indexing, e.g. trajectory[100:200], reads only the requested frames
+    of 'f' from disk; 'f_old' does the same for 'f_old' if it was kept.
+
+    Attributes
+    ----------
+    T :       temperature the trajectory was prepared at
+    seed :    seed of the recording, if given
+    lattice : 'Lattice' of the recording
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'header.json')) as file:
+            self.header = json.load(file)
+        self.T = self.header['T']
+        self.seed = self.header['seed']
+        self.lattice = Lattice(self.header['L'], self.header['N'],
+                               self.header['lamb'], self.header['frame_space'],
+                               np.dtype(self.header['dtype']).type)
+
+        frames = self.header['frames']
+        self._f = np.load(os.path.join(path, 'f.npy'), mmap_mode='r')[:frames]
+        self._f_old = None
+        if self.header['keep_f_old']:
+            self._f_old = np.load(os.path.join(path, 'f_old.npy'),
+                                  mmap_mode='r')[:frames]
+
+    def __len__(self):
+        return len(self._f)
+
+    def __getitem__(self, index):
+        return np.array( self._f[index] )
+
+    def f_old(self, index):
+        """
+        Frames 'index' of the previous field configuration
+        """
+        if self._f_old is None:
+            raise ValueError('trajectory was recorded without f_old')
+        return np.array( self._f_old[index] )
+
+    def time_array_dt(self):
+        """
+        Times of every frame (timesteps)
+        """
+        return np.arange( len(self) ) * self.lattice.frame_space
+
+
+def record_trajectory(path, T, num_frames, seed=None, keep_f_old=False,
+                      lattice=default_lattice):
+    """
+    Prepares a thermalised state of temperature 'T'
+    using 'heat_bath', seeded by 'seed',
+    then evolves for 'num_frames' frames using 'Stepper',
+    recording every frame to 'path' using 'TrajectoryWriter'
+
+    Returns
+    -------
+    trajectory : 'Trajectory' of the recording
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    f_old, f = heat_bath(T, lattice=lattice)
+    stepper = Stepper(f_old, f, lattice)
+
+    with TrajectoryWriter(path, num_frames + 1, T, seed, keep_f_old,
+                          lattice=lattice) as writer:
+        writer.append(stepper.f_old, stepper.f)
+        for _ in range(num_frames):
+            writer.append(*stepper.next_frame())
+
+    return Trajectory(path)
+
+
+def load_or_record(path, T, num_frames, seed=None, keep_f_old=False,
+                   lattice=default_lattice):
+    """
+    Opens the trajectory at 'path' if it was recorded
+    with the same 'T', 'seed' and 'lattice', at least 'num_frames' long
+    and keeping 'f_old' if 'keep_f_old';
+    otherwise records it using 'record_trajectory'
+
+    Returns
+    -------
+    trajectory : 'Trajectory' of at least 'num_frames' frames after frame 0
+    """
+    try:
+        trajectory = Trajectory(path)
+    except (FileNotFoundError, ValueError):
+        trajectory = None
+
+    if trajectory is None or trajectory.T != T or trajectory.seed != seed \
+            or trajectory.lattice != lattice \
+            or len(trajectory) < num_frames + 1 \
+            or ( keep_f_old and not trajectory.header['keep_f_old'] ):
+        trajectory = record_trajectory(path, T, num_frames, seed, keep_f_old,
+                                       lattice)
+    return trajectory
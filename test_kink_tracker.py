@@ -0,0 +1,36 @@
+"""
+Tests of the detection of 'Kink_Tracker'
+"""
+import numpy as np
+
+from Discretisation import default_lattice
+from Kink_Tracker import KinkTracker
+from Kinks_and_Creations import pairs
+
+
+def random_field(rng, N):
+    """
+    A smooth random field with kinks and anti-kinks, plus noise
+    """
+    x = np.arange(N) / N
+    f = np.zeros(N)
+    for m in range(1, 8):
+        f += rng.normal(0, 1 / m) * np.sin(2 * np.pi * (m * x + rng.random()))
+    return 2 * f + 0.05 * rng.standard_normal(N)
+
+
+def test_detection_matches_pairs():
+    rng = np.random.default_rng(0)
+    N = default_lattice.N
+    tracker = KinkTracker(default_lattice)
+    f = random_field(rng, N)
+
+    for frame in range(300):
+        if frame % 50 == 0:
+            # jump to a new field
+            f = random_field(rng, N)
+        else:
+            # small moves, as between frames
+            f = f + 0.03 * rng.standard_normal(N)
+
+        assert tracker.feed(f) == pairs(f)
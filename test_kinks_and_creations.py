@@ -0,0 +1,113 @@
+"""
+Tests of the vectorized functions of 'Kinks_and_Creations'
+against their loop references
+"""
+import numpy as np
+
+from Discretisation import default_lattice
+from Kinks_and_Creations import pairs, pairs_loop, w_kink, kink_frames, \
+                                smooth_loop, smooth_pass, smooth, \
+                                creations, CreationCounter
+
+
+N = default_lattice.N
+
+
+def random_field(rng, N=N):
+    """
+    A smooth random field with kinks and anti-kinks, plus noise
+    """
+    x = np.arange(N) / N
+    f = np.zeros(N)
+    for m in range(1, 8):
+        f += rng.normal(0, 1 / m) * np.sin(2 * np.pi * (m * x + rng.random()))
+    return 2 * f + 0.05 * rng.standard_normal(N)
+
+
+def random_series(rng, length):
+    """
+    Pair numbers held for random durations, with fluctuations of a frame
+    """
+    values = rng.integers(0, 4, length)
+    series = np.repeat( values, rng.integers(1, 30, length) )[:length]
+    fluctuations = ( rng.random(length) < 0.05 ) * rng.integers(-1, 2, length)
+    return np.maximum( series + fluctuations, 0 )
+
+
+def test_pairs_matches_loop_on_single_fields():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        f = random_field(rng)
+        assert pairs(f) == pairs_loop(f)
+
+
+def test_pairs_matches_loop_on_ensembles():
+    rng = np.random.default_rng(1)
+    for R in (1, 2, 16):
+        f = np.array([ random_field(rng) for _ in range(R) ])
+        assert np.array_equal( pairs(f), pairs_loop(f) )
+
+
+def test_pairs_wrap_around():
+    # a kink and an anti-kink, each split across the boundary
+    f = np.full(N, 0.1)
+    f[N//2 : N//2 + 2*w_kink] = -1
+    for shift in range(-w_kink, w_kink + 1, 5):
+        g = np.roll(f, N//2 + shift)
+        g[N//4 : N//4 + 2*w_kink] = 1
+        assert pairs(g) == pairs_loop(g) == 1
+
+
+def test_pairs_without_zero_crossings():
+    positive = np.ones(N)
+    negative = -np.ones(N)
+    assert pairs(positive) == pairs_loop(positive) == 0
+    assert pairs(negative) == pairs_loop(negative) == 0
+
+    f = np.array([ positive, random_field(np.random.default_rng(2)),
+                   negative ])
+    assert np.array_equal( pairs(f), pairs_loop(f) )
+    assert pairs(f)[0] == pairs(f)[2] == 0
+
+
+def test_smooth_pass_matches_loop():
+    rng = np.random.default_rng(3)
+    for _ in range(300):
+        array = random_series(rng, 200)
+        d = rng.integers(1, 8)
+
+        # one pass of 'smooth_loop'
+        expected = array.copy()
+        for k in range(1, len(array) - d * (d + 1)//2):
+            if expected[k] != expected[k - 1]:
+                expected[k] = expected[k + d]
+
+        assert np.array_equal( smooth_pass(array, d), expected )
+
+
+def test_smooth_matches_loop():
+    rng = np.random.default_rng(4)
+    buff_frame = kink_frames()[1]
+    for _ in range(300):
+        array = random_series(rng, 300)
+        tmax_frame = len(array) - buff_frame
+        kept = array.copy()
+        assert np.array_equal( smooth(array, tmax_frame),
+                               smooth_loop(array.copy(), tmax_frame) )
+        assert np.array_equal( array, kept )
+
+
+def test_creation_counter_matches_creations():
+    rng = np.random.default_rng(5)
+    buff_frame = kink_frames()[1]
+    for _ in range(50):
+        array = random_series(rng, 400)
+        counter = CreationCounter()
+
+        # every prefix, so the series also ends mid-run
+        for fed, n in enumerate(array, start=1):
+            counter.feed( int(n) )
+            assert counter.frames == max( fed - buff_frame, 0 )
+            if counter.frames > 0:
+                assert counter.creations == \
+                       creations(array[:fed], counter.frames)
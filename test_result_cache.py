@@ -0,0 +1,50 @@
+"""
+Tests of the keys of 'Result_Cache'
+"""
+import sys
+
+import numpy as np
+
+import Measurements
+from Measurements import measure
+from Result_Cache import cache_key, code_version, ResultCache
+
+
+def test_measurements_change_changes_key(tmp_path, monkeypatch):
+    before = cache_key(measure, (1.0, 10, 100), seed=0)[0]
+
+    # the same module with an observer edited
+    with open(Measurements.__file__) as file:
+        source = file.read()
+    edited = tmp_path / 'Measurements.py'
+    edited.write_text( source.replace("'E_avg': self.E / self.e_tests",
+                                      "'E_avg': self.E / self.e_tests / 2") )
+    monkeypatch.setattr(sys.modules['Measurements'], '__file__', str(edited))
+    code_version.cache_clear()
+    try:
+        after = cache_key(measure, (1.0, 10, 100), seed=0)[0]
+    finally:
+        monkeypatch.undo()
+        code_version.cache_clear()
+
+    assert before != after
+    assert cache_key(measure, (1.0, 10, 100), seed=0)[0] == before
+
+
+def test_backend_changes_key(monkeypatch):
+    monkeypatch.setenv('STEPPING_BACKEND', 'rolling')
+    rolling = cache_key(measure, (1.0, 10, 100), seed=0)[0]
+    monkeypatch.setenv('STEPPING_BACKEND', 'inplace')
+    inplace = cache_key(measure, (1.0, 10, 100), seed=0)[0]
+    assert rolling != inplace
+
+
+def test_unseeded_call_not_stored(tmp_path):
+    with ResultCache(str(tmp_path)) as cache:
+        first = cache.call(np.random.random)
+        assert cache.size() == 0
+        assert cache.call(np.random.random) != first
+
+        seeded = cache.call(np.random.random, seed=0)
+        assert cache.size() > 0
+        assert cache.call(np.random.random, seed=0) == seeded
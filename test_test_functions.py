@@ -0,0 +1,17 @@
+"""
+Tests of the adaptive tests of 'Test_Functions'
+"""
+import numpy as np
+
+from Test_Functions import pairs_test_adaptive
+
+
+def test_zero_mean_stops_on_absolute_error():
+    # no pairs at low temperature, so the relative error stays infinite
+    np.random.seed(0)
+    E_avg, n_avg, n_err, ess, frames = pairs_test_adaptive(
+            0.1, min_frame=200, max_frame=20000, check_frames=100 )
+
+    assert n_avg == 0
+    assert n_err <= 1e-3
+    assert frames < 20000